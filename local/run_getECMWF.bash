@@ -11,11 +11,15 @@ CURRENT_TIME=$(date +%d-%m-%Y_%H:%M:%S)						#get current timestamp
 
 mkdir -p ./ECMWFlogs										#create logs directory, if doesn't exist
 
+RUN_DIR=/Users/nmoisseeva/code/run/$$						#working directory of this run, so overlapping runs keep apart
+mkdir -p $RUN_DIR
+
 echo ...running getECMWF.py to download and convert data.
-python /Users/nmoisseeva/code/getECMWF.py >& "/Users/nmoisseeva/code/ECMWFlogs/$CURRENT_TIME.txt"	#run python script, save output
+#getECMWF.py and the *ECMWF.py modules come from operational/, settings from getECMWF.ini
+python /Users/nmoisseeva/code/getECMWF.py --config /Users/nmoisseeva/code/getECMWF.ini --run-dir $RUN_DIR/ >& "/Users/nmoisseeva/code/ECMWFlogs/$CURRENT_TIME.txt"	#run python script, save output
 
-echo ...removing downloaded xml files
-rm *xml														#remove xml files
+echo ...removing working files
+rm -r $RUN_DIR							#remove all working files
 
 echo ECMWF download attempt complete: $date
 echo Check status log in /Users/nmoisseeva/code/ECMWFlogs directory
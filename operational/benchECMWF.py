@@ -0,0 +1,225 @@
+#===================
+# benchECMWF.py
+#===================
+"""
+***meta***
+Benchmark for the download, XML->CSV conversion and hub assembly stages at production scale.
+
+Synthetic yr.no locationforecast 1.9 documents are generated for N stations x M instant
+timesteps with the full 11-variable set (plus the precipitation intervals between
+timesteps), served from a local keep-alive HTTP server, and pushed through the same
+fetchECMWF / parseECMWF / hubECMWF code the operational script uses. Each stage is timed
+separately and the best of --repeat runs is reported.
+
+Usage:
+	python benchECMWF.py --stations 500 --timesteps 85 --workers 16 --convert-workers 4
+"""
+
+import os, sys, io, time, json, random, shutil, tempfile, argparse, datetime, threading, multiprocessing
+try:
+	from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler						#python 2.7
+	from SocketServer import ThreadingMixIn
+	from urlparse import urlsplit
+except ImportError:
+	from http.server import HTTPServer, BaseHTTPRequestHandler
+	from socketserver import ThreadingMixIn
+	from urllib.parse import urlsplit
+import fetchECMWF
+import parseECMWF
+import hubECMWF
+
+
+#full variable set, as in local/getECMWF.py
+var_names = ['temperature', 'windDirection','windSpeed','humidity','pressure','cloudiness',\
+			'fog','lowClouds','mediumClouds', 'highClouds','dewpointTemperature']
+var_attr = ['value','deg','mps','value','value','percent','percent','percent','percent','percent','value']
+var_units = ['(c)','(deg)','(mps)','(pcnt)','(hPa)','(pcnt)','(pcnt)','(pcnt)','(pcnt)','(pcnt)','(c)']
+
+#instant record, following the sample in the getECMWF.py docstring
+INSTANT = '''		<time datatype="forecast" from="%(to)s" to="%(to)s">
+			<location altitude="%(alt)d" latitude="%(lat).4f" longitude="%(lon).4f">
+				<temperature id="TTT" unit="celsius" value="%(ttt).1f"/>
+				<windDirection id="dd" deg="%(dd).1f" name="SW"/>
+				<windSpeed id="ff" mps="%(ff).1f" beaufort="3" name="Lett bris"/>
+				<humidity value="%(hum).1f" unit="percent"/>
+				<pressure id="pr" unit="hPa" value="%(pr).1f"/>
+				<cloudiness id="NN" percent="%(nn).1f"/>
+				<fog id="FOG" percent="0.0"/>
+				<lowClouds id="LOW" percent="%(low).1f"/>
+				<mediumClouds id="MEDIUM" percent="%(med).1f"/>
+				<highClouds id="HIGH" percent="%(high).1f"/>
+				<dewpointTemperature id="TD" unit="celsius" value="%(td).1f"/>
+			</location>
+		</time>
+'''
+INTERVAL = '''		<time datatype="forecast" from="%(from)s" to="%(to)s">
+			<location altitude="%(alt)d" latitude="%(lat).4f" longitude="%(lon).4f">
+				<precipitation unit="mm" value="%(pp).1f"/>
+				<symbol id="Cloud" number="4"/>
+			</location>
+		</time>
+'''
+
+
+def make_forecast(lat, lon, ntimes, run_dt, seed=0):
+	"""Synthetic locationforecast 1.9 document (bytes) with ntimes 3-hourly instant records."""
+	rand = random.Random(seed)
+	fmt = '%Y-%m-%dT%H:%M:%SZ'
+	parts = ['<?xml version="1.0" encoding="utf-8"?>\n',
+		'<weatherdata xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" '
+		'xsi:noNamespaceSchemaLocation="http://api.met.no/weatherapi/locationforecast/1.9/schema" '
+		'created="%s">\n' %(run_dt + datetime.timedelta(hours=8)).strftime(fmt),
+		'	<meta>\n		<model name="EC.GEO.0.25" termin="%s" runended="%s" nextrun="%s" from="%s" to="%s" />\n	</meta>\n' %(
+			run_dt.strftime(fmt), (run_dt + datetime.timedelta(hours=6)).strftime(fmt),
+			(run_dt + datetime.timedelta(hours=18)).strftime(fmt), run_dt.strftime(fmt),
+			(run_dt + datetime.timedelta(hours=3 * ntimes)).strftime(fmt)),
+		'	<product class="pointData">\n']
+	for nRec in range(ntimes):
+		fields = {'alt': rand.randint(0, 1500), 'lat': lat, 'lon': lon,
+			'from': (run_dt + datetime.timedelta(hours=3 * nRec)).strftime(fmt),
+			'to': (run_dt + datetime.timedelta(hours=3 * (nRec + 1))).strftime(fmt),
+			'ttt': rand.uniform(-20, 25), 'dd': rand.uniform(0, 360), 'ff': rand.uniform(0, 20),
+			'hum': rand.uniform(30, 100), 'pr': rand.uniform(980, 1040), 'nn': rand.uniform(0, 100),
+			'low': rand.uniform(0, 100), 'med': rand.uniform(0, 100), 'high': rand.uniform(0, 100),
+			'td': rand.uniform(-25, 10), 'pp': rand.choice([0., 0., rand.uniform(0, 5)])}
+		parts.append(INSTANT %fields)
+		parts.append(INTERVAL %fields)
+	parts.append('	</product>\n</weatherdata>\n')
+	return ''.join(parts).encode('utf-8')
+
+
+class _Server(ThreadingMixIn, HTTPServer):
+	daemon_threads = True
+
+
+def serve(documents, failures=None, etags=False):
+	"""
+	Serve {(lat, lon) query string: bytes} on a local port; returns (server, api_url).
+
+	failures maps a query string to the number of 503 replies it gets before its document
+	(for retry tests); with etags, documents carry an ETag and a matching If-None-Match
+	gets a 304. Every request is logged in server.requests as (query string, status).
+	"""
+	import hashlib
+	failures = dict(failures or {})
+
+	class Handler(BaseHTTPRequestHandler):
+		protocol_version = 'HTTP/1.1'											#keep-alive, like api.yr.no
+		disable_nagle_algorithm = True											#headers and body go out as separate writes
+
+		def reply(self, status, body=b'', headers=()):
+			server.requests.append((urlsplit(self.path).query, status))
+			self.send_response(status)
+			for name, value in headers:
+				self.send_header(name, value)
+			self.send_header('Content-Length', str(len(body)))
+			self.end_headers()
+			self.wfile.write(body)
+
+		def do_GET(self):
+			query = urlsplit(self.path).query
+			body = documents.get(query)
+			if body is None:
+				return self.reply(404)
+			if failures.get(query, 0) > 0:
+				failures[query] = failures[query] - 1
+				return self.reply(503)
+			headers = [('Content-Type', 'application/xml; charset=utf-8')]
+			if etags:
+				etag = '"%s"' %hashlib.sha1(body).hexdigest()
+				if self.headers.get('If-None-Match') == etag:
+					return self.reply(304, headers=[('ETag', etag)])
+				headers.append(('ETag', etag))
+			self.reply(200, body, headers)
+
+		def log_message(self, *args):
+			pass
+
+	server = _Server(('127.0.0.1', 0), Handler)
+	server.requests = []
+	thread = threading.Thread(target=server.serve_forever, args=(0.05,))				#short poll so shutdown() returns quickly
+	thread.daemon = True
+	thread.start()
+	return server, 'http://127.0.0.1:%d/weatherapi/locationforecast/1.9/' %server.server_address[1]
+
+
+def best_of(repeat, func):
+	"""Run func repeat times; returns (best wall time, last result)."""
+	best = None
+	for i in range(repeat):
+		start = time.time()
+		result = func()
+		elapsed = time.time() - start
+		best = elapsed if best is None else min(best, elapsed)
+	return best, result
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__.split('\n')[2])
+	parser.add_argument('--stations', type=int, default=200)
+	parser.add_argument('--timesteps', type=int, default=85, help='instant records per station (3-hourly)')
+	parser.add_argument('--workers', type=int, default=8, help='concurrent downloads')
+	parser.add_argument('--convert-workers', type=int, default=0, help='conversion processes (0: serial)')
+	parser.add_argument('--repeat', type=int, default=3)
+	parser.add_argument('--json', help='also write results to this file')
+	args = parser.parse_args()
+
+	run_dt = datetime.datetime(2016, 2, 10, 0)
+	rand = random.Random(1)
+	lat = [rand.uniform(45., 60.) for i in range(args.stations)]
+	lon = [rand.uniform(-130., -115.) for i in range(args.stations)]
+	stations = ['STN%05d' %i for i in range(args.stations)]
+	urls = [fetchECMWF.station_url('', lat[i], lon[i]) for i in range(args.stations)]
+	documents = dict((urls[i][1:], make_forecast(lat[i], lon[i], args.timesteps, run_dt, i)) for i in range(args.stations))
+	server, api_url = serve(documents)
+	urls = [api_url + url for url in urls]
+	run_dir = tempfile.mkdtemp(prefix='benchECMWF') + os.sep
+	results = {'stations': args.stations, 'timesteps': args.timesteps, 'vars': len(var_names),
+		'bytes': sum(len(doc) for doc in documents.values())}
+
+	try:
+		#download: bodies read into memory, no conversion
+		fetch_s, bodies = best_of(args.repeat, lambda: fetchECMWF.fetch_all(
+			urls, lambda n, response: response.read(), args.workers, 30., 0, 0.))
+		if None in bodies:
+			sys.exit('Benchmark download failed for %d stations' %bodies.count(None))
+		results['fetch_s'] = fetch_s
+
+		#conversion: xml -> csv + parsed arrays, serial or in a process pool
+		def convert():
+			if not args.convert_workers:
+				return [parseECMWF.xml_to_csv(io.BytesIO(bodies[i]), stations[i], run_dir, var_names, var_attr, var_units)
+					for i in range(args.stations)]
+			pool = multiprocessing.Pool(args.convert_workers)
+			jobs = [pool.apply_async(parseECMWF.parse_bytes, (body, var_names, var_attr)) for body in bodies]
+			forecasts = []
+			for i, job in enumerate(jobs):
+				meta_time, rows, precip_rows = job.get()
+				forecasts.append(parseECMWF.write_csv(meta_time, rows, stations[i], run_dir, var_names, var_units))
+			pool.close()
+			pool.join()
+			return forecasts
+		convert_s, forecasts = best_of(args.repeat, convert)
+		results['convert_s'] = convert_s
+		results['records_per_s'] = sum(len(fcst.times) for fcst in forecasts) / convert_s
+
+		#hub assembly: cube plus one hub file per variable
+		def assemble():
+			run, leads, cube = hubECMWF.assemble_cube(forecasts)
+			for nVar in range(len(var_names)):
+				hubECMWF.save_hub(run_dir + 'VAR%02d.1.t' %nVar, leads, cube, nVar)
+		results['assemble_s'] = best_of(args.repeat, assemble)[0]
+	finally:
+		server.shutdown()
+		shutil.rmtree(run_dir)
+
+	print('%(stations)d stations x %(timesteps)d timesteps x %(vars)d vars, %(bytes)d bytes of XML' %results)
+	print('download:   %8.3f s  (%.1f MB/s)' %(results['fetch_s'], results['bytes'] / results['fetch_s'] / 1e6))
+	print('conversion: %8.3f s  (%.0f records/s)' %(results['convert_s'], results['records_per_s']))
+	print('hub files:  %8.3f s' %results['assemble_s'])
+	if args.json:
+		json.dump(results, open(args.json, 'w'), indent=1, sort_keys=True)
+
+
+if __name__ == '__main__':
+	main()
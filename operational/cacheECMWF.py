@@ -0,0 +1,158 @@
+#===================
+# cacheECMWF.py
+#===================
+"""
+***meta***
+Local response cache for the locationforecast fetch stage, keyed by station coordinates.
+
+For every (lat, lon) the cache keeps the ETag/Last-Modified validators returned by the
+server, the last model run (termin) seen, the parsed forecast arrays and the station csv
+text. The fetch stage sends these validators as a conditional request; a 304 reply, or
+a 200 reply whose model run matches the cached one, is answered from the cache without
+converting the station again, and the csv files are restored to the run directory.
+
+Layout of cache_dir:
+	index.json				one entry per coordinate key (validators, termin, size, last checked)
+	<lat>_<lon>.npz			parsed valid times, values and precipitation intervals for that point,
+							and the bytes of its csv (and precipitation csv) if one was written
+"""
+
+import os, time, json, datetime, threading
+import numpy as np
+import parseECMWF
+import publishECMWF
+
+
+def open_cache(cache_dir):
+	"""Load the cache index from cache_dir (created if missing)."""
+	if not os.path.isdir(cache_dir):
+		os.makedirs(cache_dir)
+	index = {}
+	index_file = os.path.join(cache_dir, 'index.json')
+	if os.path.exists(index_file):
+		try:
+			index = json.load(open(index_file))
+		except ValueError:
+			print('WARNING: unreadable cache index %s, starting empty' %index_file)
+	return {'dir': cache_dir, 'index': index, 'lock': threading.Lock()}
+
+
+def cache_key(lat, lon):
+	"""Coordinate key used for index entries and file names."""
+	return '%.4f_%.4f' %(lat, lon)
+
+
+def lookup(cache, key, var_names, precip=False, var_units=None):
+	"""
+	Return the index entry for key if it holds the same variables (and precipitation), else None.
+
+	With var_units the station csv is needed as well, so the entry must also hold a csv
+	written with those units.
+	"""
+	with cache['lock']:
+		entry = cache['index'].get(key)
+	if entry is None or entry['var_names'] != list(var_names) or entry.get('precip', False) != precip:
+		return None
+	if var_units is not None and entry.get('csv_units') != list(var_units):
+		return None
+	if not os.path.exists(os.path.join(cache['dir'], entry['file'])):
+		return None
+	return entry
+
+
+def request_headers(entry):
+	"""Conditional request headers for a cache entry (empty when there is nothing cached)."""
+	headers = {}
+	if entry is not None:
+		if entry.get('etag'):
+			headers['If-None-Match'] = entry['etag']
+		if entry.get('last_modified'):
+			headers['If-Modified-Since'] = entry['last_modified']
+	return headers
+
+
+def load(cache, entry, stn, run_dir=None):
+	"""
+	Rebuild a parseECMWF.Forecast for station stn from a cache entry. With run_dir, the
+	cached csv files are written there under stn's name, as a fresh conversion would.
+	"""
+	data = np.load(os.path.join(cache['dir'], entry['file']))
+	run_dt = datetime.datetime.strptime(entry['termin'], '%Y-%m-%dT%H:%M:%SZ')
+	precip = data['precip'] if 'precip' in data.files else None
+	csvname = None
+	if run_dir is not None and 'csv' in data.files:
+		csvname = parseECMWF.csv_name(run_dir, run_dt, stn)
+		open(csvname, 'wb').write(data['csv'].tobytes())
+		if 'precip_csv' in data.files:
+			open(parseECMWF.csv_name(run_dir + 'precip', run_dt, stn), 'wb').write(data['precip_csv'].tobytes())
+	return parseECMWF.Forecast(stn, run_dt, csvname, data['times'], data['values'], precip)
+
+
+def validators(response):
+	"""Cache validators sent with an HTTP response."""
+	return {'etag': response.getheader('ETag'), 'last_modified': response.getheader('Last-Modified')}
+
+
+def touch(cache, key, valid):
+	"""Record that key was confirmed unchanged, refreshing validators the server re-sent."""
+	with cache['lock']:
+		entry = cache['index'][key]
+		entry['checked'] = time.time()
+		for field in ('etag', 'last_modified'):
+			if valid[field]:
+				entry[field] = valid[field]
+
+
+def store(cache, key, fcst, valid, var_names, var_units=None):
+	"""
+	Save a freshly parsed forecast and its response validators under key, with the
+	station csv files if fcst has them (var_units are the units they were written with).
+	"""
+	filename = key + '.npz'
+	path = os.path.join(cache['dir'], filename)
+	arrays = {'times': fcst.times, 'values': fcst.values}
+	if fcst.precip is not None:
+		arrays['precip'] = fcst.precip
+	if fcst.csvname is not None:
+		arrays['csv'] = np.fromfile(fcst.csvname, dtype=np.uint8)
+		if fcst.precip is not None:
+			csv_dir, csv_file = os.path.split(fcst.csvname)
+			arrays['precip_csv'] = np.fromfile(os.path.join(csv_dir, 'precip' + csv_file), dtype=np.uint8)
+	with publishECMWF.atomic_write(path, 'wb') as tmpfile:					#never leave a half-written entry
+		np.savez(tmpfile, **arrays)
+	entry = {
+		'file': filename,
+		'termin': fcst.run_dt.strftime('%Y-%m-%dT%H:%M:%SZ'),
+		'var_names': list(var_names),
+		'precip': fcst.precip is not None,
+		'csv_units': list(var_units) if fcst.csvname is not None and var_units is not None else None,
+		'etag': valid['etag'],
+		'last_modified': valid['last_modified'],
+		'bytes': os.path.getsize(path),
+		'checked': time.time(),
+	}
+	with cache['lock']:
+		cache['index'][key] = entry
+
+
+def evict(cache, max_age, max_bytes):
+	"""Drop entries not confirmed for max_age seconds, then the oldest until under max_bytes."""
+	index = cache['index']
+	now = time.time()
+	by_age = sorted(index, key=lambda key: index[key]['checked'])
+	total = sum(index[key]['bytes'] for key in index)
+	for key in by_age:
+		if now - index[key]['checked'] <= max_age and total <= max_bytes:
+			break
+		total = total - index[key]['bytes']
+		path = os.path.join(cache['dir'], index[key]['file'])
+		if os.path.exists(path):
+			os.remove(path)
+		del index[key]
+
+
+def save(cache):
+	"""Write the cache index back to disk."""
+	index_file = os.path.join(cache['dir'], 'index.json')
+	with publishECMWF.atomic_write(index_file) as indexopen:
+		json.dump(cache['index'], indexopen, indent=1, sort_keys=True)
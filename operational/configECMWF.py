@@ -0,0 +1,211 @@
+#===================
+# configECMWF.py
+#===================
+"""
+***meta***
+Run configuration for getECMWF.py: stations, variables, stage settings and output profiles
+in one ini file, parsed once.
+
+Sections:
+	[run]				any getECMWF.py input (data_dir, precip_flag, fetch_workers, cache_dir, ...),
+						read with the type of its default in getECMWF.py (lists are space separated)
+	[stations]			<name> = <lat> <lon>, one line per station; without this section
+						stations are read from cfg_file (wpVerif2.cfg format)
+	[variables]			<xml element> = <attribute> <csv unit>, in csv column order
+	[output <name>]		one section per output profile; every profile is written from the
+						same fetch and parse pass. Keys: layout, dir (default data_dir) and,
+						for hub and site files, vars and files (file names, aligned with vars)
+
+Layouts:
+	hub			<dir><yymmddHH>/ASCII/m/g3/<file>.1.t for each of vars, plus <file>.1.t.OK
+	csv			station csv (and precipitation csv) copied to <dir><stn>/<year>/<month>/
+	columnar	<dir><yymmddHH>.npz with all stations and variables (storeECMWF)
+	history		appended to the history archive in <dir> (historyECMWF)
+	sites		<dir><yymmddHH>/<file>.sites.t for each of vars, interpolated to the turbine
+				sites and hub heights in the file given by sites (interpECMWF). Optional keys:
+				height_column (4, as in wpVerif2.cfg), method (idw or bilinear), power and
+				neighbours (idw), profile (power, log or none), alpha, z0 and weights_dir
+				(cache for the site weights, default cache_dir)
+
+Stations come back as a Stations tuple (names, lat and lon arrays) and outputs as Output
+tuples whose vars are index arrays into the variable list; layout specific settings
+(e.g. the parsed Sites of a sites output) are in Output.options.
+"""
+
+import os
+from collections import namedtuple
+try:
+	from ConfigParser import RawConfigParser												#python 2.7
+except ImportError:
+	from configparser import RawConfigParser
+import numpy as np
+import interpECMWF
+
+Stations = namedtuple('Stations', ['names', 'lat', 'lon'])
+Output = namedtuple('Output', ['name', 'layout', 'dir', 'vars', 'files', 'options'])
+
+LAYOUTS = ['hub', 'csv', 'columnar', 'history', 'sites']
+
+
+def read_stations(cfg_file):
+	"""Stations from a wpVerif2.cfg style file (name, lat, lon first on each line), in one read."""
+	names, lat, lon = [], [], []
+	for line in open(cfg_file):
+		fields = line.split('#')[0].split()
+		if not fields:
+			continue
+		if len(fields) < 3:
+			raise ValueError('Please ensure that latitude/longitute information is complete for all stations')
+		names.append(fields[0])
+		lat.append(float(fields[1]))
+		lon.append(float(fields[2]))
+	return Stations(names, np.array(lat), np.array(lon))
+
+
+def _typed(parser, section, key, default):
+	"""Read an option with the type of its default."""
+	if isinstance(default, bool):
+		return parser.getboolean(section, key)
+	elif isinstance(default, int):
+		return parser.getint(section, key)
+	elif isinstance(default, float):
+		return parser.getfloat(section, key)
+	elif isinstance(default, list):
+		return parser.get(section, key).split()
+	return parser.get(section, key)
+
+
+def _option(parser, section, key, default):
+	"""Optional setting, typed like its default."""
+	if not parser.has_option(section, key):
+		return default
+	return _typed(parser, section, key, default)
+
+
+def _var_index(var_names, names, section):
+	index = []
+	for name in names:
+		if name not in var_names:
+			raise ValueError('[%s]: %s is not one of the configured variables' %(section, name))
+		index.append(var_names.index(name))
+	return np.array(index, dtype=int)
+
+
+def default_outputs(settings):
+	"""Output profiles equivalent to the var_hub, columnar_dir and history_dir settings."""
+	hub = [nVar for nVar, name in enumerate(settings['var_hub']) if name]
+	outputs = []
+	if hub:
+		outputs.append(Output('hub', 'hub', settings['data_dir'], np.array(hub, dtype=int),
+			[settings['var_hub'][nVar] for nVar in hub], {}))
+	if settings['columnar_dir']:
+		outputs.append(Output('columnar', 'columnar', settings['columnar_dir'], None, [], {}))
+	if settings['history_dir']:
+		outputs.append(Output('history', 'history', settings['history_dir'], None, [], {}))
+	return outputs
+
+
+def load_config(path, settings):
+	"""
+	Read the ini file at path on top of settings (a getECMWF.default_settings() dict).
+
+	Returns (settings, stations, outputs). stations is None without a [stations] section
+	(read cfg_file once all settings are final) and outputs is empty without [output ...]
+	sections (use default_outputs()); an output without dir gets '', meaning data_dir.
+	"""
+	parser = RawConfigParser()
+	parser.optionxform = str														#station and variable names are case sensitive
+	if not parser.read(path):
+		raise ValueError('Cannot read config file %s' %path)
+	settings = dict(settings)
+
+	if parser.has_section('run'):
+		for key in parser.options('run'):
+			if key not in settings:
+				raise ValueError('[run]: unknown setting %s' %key)
+			settings[key] = _typed(parser, 'run', key, settings[key])
+
+	if parser.has_section('variables'):
+		var_names, var_attr, var_units = [], [], []
+		for name, value in parser.items('variables'):
+			fields = value.split()
+			if len(fields) != 2:
+				raise ValueError('[variables]: expected "%s = <attribute> <unit>"' %name)
+			var_names.append(name)
+			var_attr.append(fields[0])
+			var_units.append(fields[1])
+		settings['var_names'], settings['var_attr'], settings['var_units'] = var_names, var_attr, var_units
+		if not parser.has_option('run', 'var_hub'):
+			settings['var_hub'] = [''] * len(var_names)								#hub files come from [output] sections
+
+	if parser.has_section('stations'):
+		names, lat, lon = [], [], []
+		for name, value in parser.items('stations'):
+			fields = value.split()
+			if len(fields) != 2:
+				raise ValueError('Please ensure that latitude/longitute information is complete for all stations')
+			names.append(name)
+			lat.append(float(fields[0]))
+			lon.append(float(fields[1]))
+		stations = Stations(names, np.array(lat), np.array(lon))
+	else:
+		stations = None
+
+	outputs = []
+	for section in parser.sections():
+		if not section.startswith('output '):
+			continue
+		name = section[len('output '):].strip()
+		layout = parser.get(section, 'layout')
+		if layout not in LAYOUTS:
+			raise ValueError('[%s]: layout must be one of %s' %(section, ', '.join(LAYOUTS)))
+		out_dir = parser.get(section, 'dir') if parser.has_option(section, 'dir') else ''
+		var_index, files, options = None, [], {}
+		if layout in ('hub', 'sites'):
+			var_index = _var_index(settings['var_names'], parser.get(section, 'vars').split(), section)
+			files = parser.get(section, 'files').split()
+			if len(files) != len(var_index):
+				raise ValueError('[%s]: vars and files must be the same length' %section)
+		if layout == 'sites':
+			options = {
+				'sites': interpECMWF.read_sites(parser.get(section, 'sites'), _option(parser, section, 'height_column', 4)),
+				'method': _option(parser, section, 'method', 'idw'),
+				'profile': _option(parser, section, 'profile', 'power'),
+				'alpha': _option(parser, section, 'alpha', 1/7.),
+				'z0': _option(parser, section, 'z0', 0.03),
+				'weights_dir': _option(parser, section, 'weights_dir', settings['cache_dir']),
+				'params': {},
+			}
+			if options['method'] == 'idw':
+				options['params'] = {'power': _option(parser, section, 'power', 2.), 'neighbours': _option(parser, section, 'neighbours', 4)}
+			elif options['method'] not in interpECMWF.METHODS:
+				raise ValueError('[%s]: method must be one of %s' %(section, ', '.join(sorted(interpECMWF.METHODS))))
+		outputs.append(Output(name, layout, out_dir, var_index, files, options))
+	return settings, stations, outputs
+
+
+def output_paths(output, run_key, forecasts, stations):
+	"""Files an output profile writes for a run (history appends in place and has none)."""
+	if output.layout == 'hub':
+		hub_dir = output.dir + run_key + '/ASCII/m/g3/'
+		return [hub_dir + name + '.1.t' for name in output.files]
+	elif output.layout == 'columnar':
+		return [output.dir + run_key + '.npz']
+	elif output.layout == 'sites':
+		return [output.dir + run_key + '/' + name + '.sites.t' for name in output.files]
+	elif output.layout == 'csv':
+		paths = []
+		for nStn, fcst in enumerate(forecasts):
+			if fcst is None or fcst.csvname is None:
+				continue															#no data, or no csv written (no run_dir)
+			stn_dir = station_dir(output, stations[nStn], fcst.run_dt)
+			paths.append(stn_dir + os.path.basename(fcst.csvname))
+			if fcst.precip is not None:
+				paths.append(stn_dir + 'precip' + os.path.basename(fcst.csvname))
+		return paths
+	return []
+
+
+def station_dir(output, stn, run_dt):
+	"""Directory of a station's files in the csv layout."""
+	return output.dir + stn + '/' + str(run_dt.year) + '/' + str(run_dt.month) + '/'
@@ -0,0 +1,186 @@
+#===================
+# fetchECMWF.py
+#===================
+"""
+***meta***
+Concurrent downloader for the yr.no locationforecast API.
+
+A fixed pool of worker threads pulls stations off a shared queue, so no more than
+`workers` requests are ever in flight. Each worker keeps one keep-alive connection
+per host and reuses it for all the stations it handles. Failed requests (timeouts,
+dropped connections, 5xx replies) are retried with exponential backoff; a station
+that still fails is reported and returned as None so it cannot stall the run.
+
+The base url is an input, so the whole stage can be pointed at a local stand-in
+server serving canned XML. Stations at the same point (after rounding) are planned as
+one request by unique_points().
+"""
+
+import sys, time, threading
+try:
+	import httplib																#python 2.7
+	from urlparse import urlsplit
+	from Queue import Queue, Empty
+except ImportError:
+	import http.client as httplib
+	from urllib.parse import urlsplit
+	from queue import Queue, Empty
+
+_print_lock = threading.Lock()
+
+
+def log(msg):
+	"""Print a line from a download thread (or its consume callback) without interleaving it with other threads' lines."""
+	with _print_lock:
+		sys.stdout.write(msg + '\n')
+
+
+def unique_points(lat, lon, digits=4):
+	"""
+	Group stations by (lat, lon) rounded to digits (as in the cache keys).
+
+	Returns (first, point): the first station at each unique point, and the point of
+	every station as an index into first.
+	"""
+	first, point, seen = [], [], {}
+	for nStn in range(len(lat)):
+		key = (round(lat[nStn], digits), round(lon[nStn], digits))
+		if key not in seen:
+			seen[key] = len(first)
+			first.append(nStn)
+		point.append(seen[key])
+	return first, point
+
+
+def station_url(api_url, lat, lon):
+	"""Build the locationforecast request url for a single point."""
+	return api_url + '?lat=' + str(lat) + ';lon=' + str(lon) + ';'
+
+
+class TeeReader(object):
+	"""File-like wrapper that copies everything read from `stream` into `copy`."""
+
+	def __init__(self, stream, copy):
+		self.stream = stream
+		self.copy = copy
+
+	def read(self, size=-1):
+		data = self.stream.read() if size is None or size < 0 else self.stream.read(size)
+		self.copy.write(data)
+		return data
+
+
+class CountingReader(object):
+	"""Response wrapper that counts the body bytes read through it."""
+
+	def __init__(self, response):
+		self.response = response
+		self.nbytes = 0
+
+	def read(self, size=-1):
+		data = self.response.read() if size is None or size < 0 else self.response.read(size)
+		self.nbytes = self.nbytes + len(data)
+		return data
+
+	def __getattr__(self, name):
+		return getattr(self.response, name)										#status, getheader(), ...
+
+
+def _request(conns, url, timeout, headers):
+	"""Issue a GET on the worker's keep-alive connection for the url's host."""
+	parts = urlsplit(url)
+	key = (parts.scheme, parts.netloc)
+	conn = conns.get(key)
+	if conn is None:
+		if parts.scheme == 'https':
+			conn = httplib.HTTPSConnection(parts.netloc, timeout=timeout)
+		else:
+			conn = httplib.HTTPConnection(parts.netloc, timeout=timeout)
+		conns[key] = conn
+	path = parts.path or '/'
+	if parts.query:
+		path = path + '?' + parts.query
+	conn.request('GET', path, headers=headers or {})
+	return conn.getresponse()
+
+
+def _drop(conns, url):
+	"""Close and forget a connection that is in an unknown state."""
+	parts = urlsplit(url)
+	conn = conns.pop((parts.scheme, parts.netloc), None)
+	if conn is not None:
+		conn.close()
+
+
+def _fetch_one(conns, n, url, headers, consume, timeout, retries, backoff, stats):
+	"""Fetch a single url with retries; returns consume()'s result or None."""
+	start = time.time()
+	stats[n] = {'attempts': 0, 'bytes': 0, 'status': None}
+	for attempt in range(retries + 1):
+		stats[n]['attempts'] = attempt + 1
+		stats[n]['fetch_s'] = time.time() - start
+		try:
+			response = CountingReader(_request(conns, url, timeout, headers))
+			stats[n]['status'] = response.status
+			if response.status not in (200, 304):
+				response.read()													#drain so the connection stays usable
+				if response.status < 500 and response.status != 429:
+					log('WARNING: HTTP %d for %s, not retrying' %(response.status, url))
+					return None
+				raise IOError('HTTP %d' %response.status)
+			result = consume(n, response)
+			response.read()														#drain anything the consumer left unread
+			stats[n]['bytes'] = response.nbytes
+			stats[n]['fetch_s'] = time.time() - start
+			return result
+		except Exception as e:
+			_drop(conns, url)
+			if attempt == retries:
+				log('WARNING: giving up on %s after %d attempts (%s)' %(url, attempt + 1, e))
+				return None
+			delay = backoff * 2 ** attempt
+			log('...retrying %s in %.1fs (%s)' %(url, delay, e))
+			time.sleep(delay)
+
+
+def fetch_all(urls, consume, workers=8, timeout=30., retries=3, backoff=1., headers=None, stats=None):
+	"""
+	Download all urls concurrently.
+
+	consume(n, response) is called from a worker thread with the index of the url and
+	the open HTTP response (status 200, or 304 when a conditional request in
+	headers[n] matched); it must read what it needs from the response and may be
+	called again for the same index if the request is retried. Returns the list of
+	consume() results in the order of `urls`, with None for stations that failed.
+
+	If stats is a list of len(urls), stats[n] is set to a dict with the attempts made,
+	the last HTTP status, body bytes read and fetch_s, the latency including retries
+	and the time spent in consume().
+	"""
+	if headers is None:
+		headers = [{}] * len(urls)
+	if stats is None:
+		stats = [None] * len(urls)
+	results = [None] * len(urls)
+	jobs = Queue()
+	for n, url in enumerate(urls):
+		jobs.put((n, url))
+
+	def worker():
+		conns = {}
+		while True:
+			try:
+				n, url = jobs.get_nowait()
+			except Empty:
+				break
+			results[n] = _fetch_one(conns, n, url, headers[n], consume, timeout, retries, backoff, stats)
+		for conn in conns.values():
+			conn.close()
+
+	threads = [threading.Thread(target=worker) for i in range(max(1, min(workers, len(urls))))]
+	for thread in threads:
+		thread.daemon = True
+		thread.start()
+	for thread in threads:
+		thread.join()
+	return results
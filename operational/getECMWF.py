@@ -5,6 +5,15 @@
 ***meta***
 The script gets ECMWF xml data for the supplied locations and converts it to csv format.
 
+Run from cron as a script (see run_getECMWF.bash); stations, variables, settings and output
+profiles are then read from an ini file given with --config (see configECMWF.py and
+getECMWF.ini in operational/ and local/), with the input block below as defaults.
+The stages can also be called directly, e.g. to convert a document held in memory:
+	import getECMWF
+	settings = getECMWF.default_settings(var_names=['windSpeed'], var_attr=['mps'], var_units=['(mps)'])
+	fcst = getECMWF.convert(xml_bytes, 'Dokie', settings)
+Stages: fetch() (download + convert), convert(), assemble() and publish(); main() runs them all.
+
 Sample raw data from XML file:
             <temperature id="TTT" unit="celsius" value="3.3"/>
             <windDirection id="dd" deg="243.4" name="SW"/>
@@ -35,116 +44,479 @@ var_attr = ['mps']
 #make a list of units for above vars (see meta above)
 var_units = ['(mps)']
 
+#flag to store precipitation intervals as ./run/precip<run>_<stn>.csv
+precip_flag = 0
+
+#hub file written for each var as <name>.1.t in the run directory ('' to leave a var out)
+var_hub = ['WND_HUB']
+
 #directory for saving data
 data_dir = '/nfs/neltharion/www/results/ECMWF/'
 
-#-------------end of input-----------------------
+#working directory for per-station csv (and xml) files
+run_dir = './run/'
 
-import urllib2
-import numpy as np
-from matplotlib import pyplot as plt
-import sys, os
-import datetime
-from xml.etree import ElementTree as etree
-import csv
-
-
-#stations = ['Bear_Mnt','Dokie','Quality_Wind','Quality_Wind2','Cape_Scott']
-stations = list(np.genfromtxt(cfg_file,dtype=str,usecols=0))
-lat = list(np.genfromtxt(cfg_file,dtype=float,usecols=1))
-lon = list(np.genfromtxt(cfg_file,dtype=float,usecols=2))
-
-#test that all stations have lat/lon/msl information
-if len(stations) != len(lat) or len(stations) !=  len(lon):
-	sys.exit('Please ensure that latitude/longitute information is complete for all stations')
-
-
-#test that the number of variables matches number of attributes and units
-if len(var_names) != len(var_attr) or len(var_names) != len(var_units):
-	sys.exit('Please ensure that var_names, var_attr and var_units are the same length')
-
-#loop through all supplied stations to get xml data
-for nStn, stn in enumerate(stations):
-	url = 'http://api.yr.no/weatherapi/locationforecast/1.9/?lat=' + str(lat[nStn]) + ';lon=' + str(lon[nStn]) + ';'
-	load = urllib2.urlopen(url)
-	contents = load.read()
-	xmlfile = './run/'+ stn + '.xml'
-	file = open(xmlfile, 'w')
-	file.write(contents)
-	file.close()
-	if os.path.exists(xmlfile):
-		print('XML donwload complete for ' + stn + ' station. ' + str(datetime.datetime.now()))
-
-
-#loop through all supplied stations to convert xml to csv
-print('Converting XML files to CSV -------->')
-for nStn, stn in enumerate(stations):
-	xmlfile = './run/'+ stn + '.xml'
-	print("...converting " + xmlfile)
-	tree = etree.parse(xmlfile)													#get xml tree structure
-	meta = tree.find('.//model')												#find metadata
-	meta_time = meta.attrib['termin']											#get the model run start - will become file id
-	print('Model run start time: '+ meta_time)
-	run_dt = datetime.datetime.strptime(meta_time, '%Y-%m-%dT%H:%M:%SZ')		#convert to datetime object
-	timestamp = tree.findall('.//time') 										#find all time stamps present in file
-	
-	#now write the main data file
-	run_timestamp = run_dt.strftime('%Y-%m-%d_%H%M')
-	csvname = './run/'+ run_timestamp + '_' + stn + '.csv'				#generate filename
-	csvopen = open(csvname,'w')          										#setup csv for writing
-	csvwrite = csv.writer(csvopen)
-	header = ['Timestamp'] + [ var_names[i] + var_units[i] for i in range(len(var_names))]	#create a header row
-	csvwrite.writerows([header])												#write header row
-	rec_cnt = 0																	#setup counter
-	for nRec, fcst in enumerate(timestamp):										#loop through available timesteps
-		data_row = []
-		for nVar, var in enumerate(var_names):									#loop through required variables
-			child_call = './/' + var 											#generate search argument
-			get_var = fcst.find(child_call)										#get instance of variable
-			if get_var is not None:												#check that record exists
-				data_row.extend([get_var.attrib[var_attr[nVar]]])				#append row with new daata
-		data_row = [fcst.attrib['from']] + data_row								#add time step at the beginning of the row	
-		if len(data_row) == len(var_names) + 1: 								#check that no data is missing
-			csvwrite.writerows([data_row])										#if all data is present write wrote to csv
-			rec_cnt = rec_cnt + 1 													#add counter
-
-	csvopen.close()																#close csv
-	print("Total number of records stored for each variable: " + str(rec_cnt))
-
-	#save csv file in local directory
-	save_path = './run/' + run_timestamp + '_' + stn + '.csv'
-	os.renames(csvname, save_path)
-	print('Saving individual station file %s to directory %s ' %(csvname, save_path))
-
-#construct a Wind Hub file from existing station files 							#create storage array for all stations
-WND_HUB = np.empty((rec_cnt,len(stations)+1)) * np.nan
-for nStn, stn in enumerate(stations):
-	stnfile = './run/'+ run_timestamp + '_' + stn + '.csv' 						#generate filename
-	#if on first stsation - extract forecast horizon
-	if nStn==0:
-		fcsthr = np.genfromtxt(stnfile,usecols=0,dtype=str,skip_header=1,delimiter=',') 	#for first run record forecast horizons
-		if len(fcsthr)!=(rec_cnt):
-			print('WARNING: mismatch in number of records between stations. Requires manual verification!!!') #check that all files are the same
-		delt = [datetime.datetime.strptime(fcsthr[i], '%Y-%m-%dT%H:%M:%SZ') - run_dt for i in range(rec_cnt)] #calculate time offset
-		offset = [int(delt[i].days * 24. + delt[i].seconds /3600.) for i in range(rec_cnt)] 					#convert to hours
-		WND_HUB[:,0] = offset 													#store offset
-	WND_HUB[:,nStn+1] = np.genfromtxt(stnfile,usecols=1,skip_header=1,delimiter=',') 		#store wind data for all stations
-
-
-#save csv file in appropriate directory
-save_path = data_dir + run_dt.strftime('%y%m%d%H')  + '/ASCII/m/g3/WND_HUB.1.t'
-row_format = ['%d'] + (['%f' for i in range(len(stations))])
-np.savetxt(save_path,WND_HUB,fmt=row_format, delimiter=' ')
-print('Saved wind hub file to directory %s ' %save_path)
-
-os.mknod(data_dir + run_dt.strftime('%y%m%d%H')  + '/ASCII/m/g3/WND_HUB.1.t.OK')
-
-print('======================COMPLETE========================')
+#locationforecast API base url (point at a local server for testing)
+api_url = 'http://api.yr.no/weatherapi/locationforecast/1.9/'
 
+#download settings: concurrent requests, per-request timeout (s), retries and initial backoff (s)
+fetch_workers = 8
+fetch_timeout = 30.
+fetch_retries = 3
+fetch_backoff = 1.
 
+#convert straight from the download stream (True) or save ./run/<stn>.xml first and convert afterwards (False)
+stream_convert = True
 
+#keep a copy of the raw xml when streaming: '' (none), 'xml' or 'gz', and where to put it
+#(run_getECMWF.bash empties ./run after every run, so point this elsewhere to keep an archive)
+archive_xml = ''
+archive_dir = './run/'
 
+#convert in a pool of convert_workers processes; csv and hub files are still written by this
+#process, in station order (0 converts serially in the download threads, easier to debug)
+convert_workers = 0
 
+#response cache for conditional requests in stream mode ('' disables it), and its eviction limits:
+#entries not confirmed for cache_max_age seconds or beyond cache_max_bytes in total are dropped
+cache_dir = './cache/'
+cache_max_age = 7 * 86400.
+cache_max_bytes = 500e6
 
+#incremental mode: skip hub regeneration when the model run is already published for every
+#station with data (published runs are recorded in manifest_file)
+incremental = True
+manifest_file = ''														#'' for data_dir + 'published.json'
 
+#optionally also write one columnar binary file per run (<yymmddHH>.npz, all stations and
+#variables as float32, memory-mappable via storeECMWF.load_run); '' disables it
+columnar_dir = ''
 
+#append every run to an indexed history archive for station/run/lead-time queries
+#(historyECMWF.query); '' disables it
+history_dir = ''
+
+#per-run timing/throughput report as json and/or Prometheus textfile ('' disables either)
+report_json = ''
+report_prom = ''
+
+#-------------end of input-----------------------
+
+#numpy and the stage modules built on it are imported inside the functions that need them,
+#so importing this module (or starting the cron job) stays cheap
+import sys, os
+import datetime
+import time
+import fetchECMWF
+import publishECMWF
+import statsECMWF
+
+#names of the inputs above, in order
+INPUTS = ['cfg_file', 'var_names', 'var_attr', 'var_units', 'precip_flag', 'var_hub', 'data_dir', 'run_dir',
+	'api_url', 'fetch_workers', 'fetch_timeout', 'fetch_retries', 'fetch_backoff', 'stream_convert',
+	'archive_xml', 'archive_dir', 'convert_workers', 'cache_dir', 'cache_max_age', 'cache_max_bytes',
+	'incremental', 'manifest_file', 'columnar_dir', 'history_dir', 'report_json', 'report_prom']
+
+
+def default_settings(**overrides):
+	"""Settings dict from the input block above, with any overrides applied."""
+	settings = dict((name, globals()[name]) for name in INPUTS)
+	settings.update(overrides)
+	return settings
+
+
+def manifest_path(settings):
+	"""Manifest of published runs ('' means data_dir + 'published.json')."""
+	return settings['manifest_file'] or settings['data_dir'] + 'published.json'
+
+
+def check_settings(settings):
+	"""Raise ValueError if the per-variable input lists do not line up."""
+	nvar = len(settings['var_names'])
+	if nvar != len(settings['var_attr']) or nvar != len(settings['var_units']) or nvar != len(settings['var_hub']):
+		raise ValueError('Please ensure that var_names, var_attr, var_units and var_hub are the same length')
+
+
+def convert(data, stn, settings, run_dir=None):
+	"""
+	Convert a locationforecast document held in memory (bytes) to a parseECMWF.Forecast.
+
+	The station csv is written only if run_dir is given.
+	"""
+	import parseECMWF
+	parsed = parseECMWF.parse_bytes(data, settings['var_names'], settings['var_attr'], None, settings['precip_flag']==1)
+	meta_time, rows, precip_rows = parsed
+	return parseECMWF.write_csv(meta_time, rows, stn, run_dir, settings['var_names'], settings['var_units'], precip_rows)
+
+
+def fetch(settings, stations, lat, lon, report):
+	"""
+	Download every station and convert it to csv; returns a parseECMWF.Forecast per station
+	(None where nothing could be retrieved), in station order.
+
+	Stations sharing a point are downloaded and converted once; the other stations at that
+	point get the same parsed arrays and a copy of its csv files under their own name.
+	"""
+	import shutil
+	first, point = fetchECMWF.unique_points(lat, lon)
+	if len(first) < len(stations):
+		print('%d stations share %d points, fetching each point once' %(len(stations), len(first)))
+	results = fetch_points(settings, [stations[nStn] for nStn in first], [lat[nStn] for nStn in first],
+		[lon[nStn] for nStn in first], report)
+
+	#fan the parsed forecasts out to every station at the same point
+	shared = [None] * len(stations)
+	for nStn, stn in enumerate(stations):
+		source = results[point[nStn]]
+		if first[point[nStn]] == nStn or source is None:
+			shared[nStn] = source
+			if source is None and first[point[nStn]] != nStn:
+				statsECMWF.station(report, stn, failed=True, shared=stations[first[point[nStn]]])
+			continue
+		csvname = None
+		if source.csvname is not None:											#copy its csv under this station's name
+			csv_dir, csv_file = os.path.split(source.csvname)
+			csvname = os.path.join(csv_dir, csv_file[:-len(source.stn + '.csv')] + stn + '.csv')
+			shutil.copyfile(source.csvname, csvname)
+			if source.precip is not None:
+				shutil.copyfile(os.path.join(csv_dir, 'precip' + csv_file), os.path.join(csv_dir, 'precip' + os.path.basename(csvname)))
+		shared[nStn] = source._replace(stn=stn, csvname=csvname)
+		statsECMWF.station(report, stn, failed=False, shared=source.stn)
+		print('Forecast for ' + stn + ' station shared with ' + source.stn + ' station (same point)')
+	return shared
+
+
+def fetch_points(settings, stations, lat, lon, report):
+	"""
+	Download and convert each station in the list as given; returns a parseECMWF.Forecast
+	per station (None where nothing could be retrieved), in station order.
+	"""
+	import parseECMWF
+	var_names, var_attr, var_units = settings['var_names'], settings['var_attr'], settings['var_units']
+	run_dir = settings['run_dir']
+	precip = settings['precip_flag']==1
+	cache_dir = settings['cache_dir']
+	archive_xml, archive_dir = settings['archive_xml'], settings['archive_dir']
+	if cache_dir:
+		import cacheECMWF
+	if archive_xml == 'gz':
+		import gzip
+
+	#download xml data for all supplied stations concurrently
+	def save_xml(nStn, response):
+		import shutil
+		xmlfile = run_dir + stations[nStn] + '.xml'
+		file = open(xmlfile, 'wb')
+		shutil.copyfileobj(response, file)
+		file.close()
+		fetchECMWF.log('XML donwload complete for ' + stations[nStn] + ' station. ' + str(datetime.datetime.now()))
+		return xmlfile
+
+	#open the raw xml archive copy for a station, if requested
+	def open_archive(stn):
+		if archive_xml == 'gz':
+			return gzip.open(archive_dir + stn + '.xml.gz', 'wb'), archive_dir + stn + '.xml.gz'
+		elif archive_xml:
+			return open(archive_dir + stn + '.xml', 'wb'), archive_dir + stn + '.xml'
+		return None, None
+
+	#answer a station from the cache when its forecast has not changed
+	def from_cache(nStn, valid, reason):
+		fetchECMWF.log('Forecast for ' + stations[nStn] + ' station ' + reason + ', using cached model run ' + cached[nStn]['termin'])
+		statsECMWF.station(report, stations[nStn], cached=True)
+		cacheECMWF.touch(cache, keys[nStn], valid)
+		return cacheECMWF.load(cache, cached[nStn], stations[nStn], run_dir)
+
+	def cached_run(nStn):
+		return cached[nStn]['termin'] if cached[nStn] is not None else None
+
+	def validators(response):
+		return cacheECMWF.validators(response) if cache_dir else None
+
+	#serial: feed the response body to the converter as it arrives, teeing raw xml to disk if requested
+	def convert_stream(nStn, response):
+		stn = stations[nStn]
+		valid = validators(response)
+		if response.status == 304:
+			return from_cache(nStn, valid, 'not modified')
+		archive, archive_path = open_archive(stn)
+		source = response if archive is None else fetchECMWF.TeeReader(response, archive)
+		start = time.time()
+		try:
+			result = parseECMWF.xml_to_csv(source, stn, run_dir, var_names, var_attr, var_units, cached_run(nStn), precip)
+		finally:
+			if archive is not None:
+				archive.close()
+		statsECMWF.station(report, stn, convert_s=time.time() - start)
+		if result is None:
+			if archive is not None:
+				os.remove(archive_path)											#only a partial copy was teed
+			return from_cache(nStn, valid, 'model run unchanged')
+		statsECMWF.station(report, stn, records=len(result.times))
+		if cache_dir:
+			cacheECMWF.store(cache, keys[nStn], result, valid, var_names, var_units)
+		fetchECMWF.log('XML download and conversion complete for ' + stn + ' station. ' + str(datetime.datetime.now()))
+		return result
+
+	#process pool: read the body in the download thread and hand the parsing to a worker process
+	def submit_stream(nStn, response):
+		stn = stations[nStn]
+		valid = validators(response)
+		if response.status == 304:
+			return from_cache(nStn, valid, 'not modified')
+		body = response.read()
+		archive, archive_path = open_archive(stn)
+		if archive is not None:
+			archive.write(body)
+			archive.close()
+		fetchECMWF.log('XML donwload complete for ' + stn + ' station. ' + str(datetime.datetime.now()))
+		return pool.apply_async(parseECMWF.parse_bytes, (body, var_names, var_attr, cached_run(nStn), precip)), valid
+
+	#single writer for pool results: csv and cache entry for each station, in station order
+	#(convert_s is the time spent waiting for the worker plus writing)
+	def finish_pooled(nStn, pending):
+		if pending is None or isinstance(pending, parseECMWF.Forecast):
+			return pending														#failed, or already answered from the cache
+		job, valid = pending
+		start = time.time()
+		try:
+			parsed = job.get()
+		except Exception as e:
+			print('WARNING: conversion failed for ' + stations[nStn] + ' station (%s)' %e)
+			return None
+		if parsed is None:
+			return from_cache(nStn, valid, 'model run unchanged')
+		meta_time, rows, precip_rows = parsed
+		result = parseECMWF.write_csv(meta_time, rows, stations[nStn], run_dir, var_names, var_units, precip_rows)
+		statsECMWF.station(report, stations[nStn], convert_s=time.time() - start, records=len(result.times))
+		if cache_dir and valid is not None:
+			cacheECMWF.store(cache, keys[nStn], result, valid, var_names, var_units)
+		return result
+
+	urls = [fetchECMWF.station_url(settings['api_url'], lat[nStn], lon[nStn]) for nStn in range(len(stations))]
+	fetch_args = (settings['fetch_workers'], settings['fetch_timeout'], settings['fetch_retries'], settings['fetch_backoff'])
+	fetch_stats = [None] * len(stations)
+	if settings['convert_workers']:
+		import multiprocessing
+		pool = multiprocessing.Pool(settings['convert_workers'])				#fork workers before any threads start
+	if settings['stream_convert']:
+		cached = [None] * len(stations)
+		if cache_dir:
+			cache = cacheECMWF.open_cache(cache_dir)
+			keys = [cacheECMWF.cache_key(lat[nStn], lon[nStn]) for nStn in range(len(stations))]
+			csv_units = var_units if run_dir is not None else None						#cached stations need their csv too
+			cached = [cacheECMWF.lookup(cache, key, var_names, precip, csv_units) for key in keys]
+			headers = [cacheECMWF.request_headers(entry) for entry in cached]
+		else:
+			headers = None
+		print('Downloading and converting XML to CSV -------->')
+		if settings['convert_workers']:
+			with statsECMWF.stage(report, 'fetch'):
+				pending = fetchECMWF.fetch_all(urls, submit_stream, *fetch_args, headers=headers, stats=fetch_stats)
+			with statsECMWF.stage(report, 'convert'):
+				results = [finish_pooled(nStn, pending[nStn]) for nStn in range(len(stations))]
+		else:
+			with statsECMWF.stage(report, 'fetch'):								#includes the streamed conversion
+				results = fetchECMWF.fetch_all(urls, convert_stream, *fetch_args, headers=headers, stats=fetch_stats)
+		if cache_dir:
+			cacheECMWF.evict(cache, settings['cache_max_age'], settings['cache_max_bytes'])
+			cacheECMWF.save(cache)
+	else:
+		with statsECMWF.stage(report, 'fetch'):
+			xmlfiles = fetchECMWF.fetch_all(urls, save_xml, *fetch_args, stats=fetch_stats)
+		print('Converting XML files to CSV -------->')
+		results = [None] * len(stations)
+		with statsECMWF.stage(report, 'convert'):
+			if settings['convert_workers']:
+				pending = [None] * len(stations)
+				for nStn, xmlfile in enumerate(xmlfiles):
+					if xmlfile is not None:
+						pending[nStn] = pool.apply_async(parseECMWF.parse_records, (xmlfile, var_names, var_attr, None, precip)), None
+				results = [finish_pooled(nStn, pending[nStn]) for nStn in range(len(stations))]
+			else:
+				for nStn, stn in enumerate(stations):
+					if xmlfiles[nStn] is not None:
+						print("...converting " + xmlfiles[nStn])
+						start = time.time()
+						try:
+							results[nStn] = parseECMWF.xml_to_csv(xmlfiles[nStn], stn, run_dir, var_names, var_attr, var_units, None, precip)
+						except Exception as e:
+							print('WARNING: conversion failed for ' + stn + ' station (%s)' %e)
+							continue
+						statsECMWF.station(report, stn, convert_s=time.time() - start, records=len(results[nStn].times))
+	if settings['convert_workers']:
+		pool.close()
+		pool.join()
+	for nStn, stn in enumerate(stations):
+		statsECMWF.station(report, stn, failed=results[nStn] is None, **(fetch_stats[nStn] or {}))
+	return results
+
+
+def log_results(settings, stations, results):
+	"""Print what was retrieved for each station."""
+	for nStn, stn in enumerate(stations):
+		if results[nStn] is None:
+			print('WARNING: no data downloaded for ' + stn + ' station, skipping')
+			continue
+		fcst = results[nStn]
+		print('Model run start time for ' + stn + ': ' + fcst.run_dt.strftime('%Y-%m-%dT%H:%M:%SZ'))
+		print("Total number of records stored for each variable: " + str(len(fcst.times)))
+		if fcst.precip is not None:
+			print('Total number of precipitation records found: ' + str(len(fcst.precip)))
+		if fcst.csvname is not None:
+			print('Saved individual station file %s ' %fcst.csvname)
+
+
+def assemble(results):
+	"""Station x lead time x variable array from the parsed forecasts: (run_dt, leads, cube)."""
+	import hubECMWF
+	return hubECMWF.assemble_cube(results)
+
+
+def publish(settings, stations, lat, lon, results, report, outputs=None):
+	"""
+	Write every output profile (configECMWF.Output) for the run from the parsed forecasts.
+
+	Without outputs, the profiles follow the var_hub, columnar_dir and history_dir settings.
+	Returns the list of files published, or an empty list if incremental mode found the
+	run already published for every station with data from this model run.
+	"""
+	import configECMWF
+	import hubECMWF
+	if outputs is None:
+		outputs = configECMWF.default_outputs(settings)
+	run_dt = hubECMWF.reference_run(results)
+	run_key = run_dt.strftime('%y%m%d%H')
+	paths = [configECMWF.output_paths(output, run_key, results, stations) for output in outputs]
+	hub_paths = sum([paths[nOut] for nOut, output in enumerate(outputs) if output.layout == 'hub'], [])
+	termins = dict((stn, results[nStn].run_dt.strftime('%Y-%m-%dT%H:%M:%SZ'))		#model run each station supplied
+		for nStn, stn in enumerate(stations) if results[nStn] is not None)
+
+	#one publisher per manifest at a time: a run that waited here finds it published below
+	with publishECMWF.lock(publishECMWF.manifest_lock(manifest_path(settings))):
+		#skip publishing entirely if this model run is already out for every station we have
+		manifest = publishECMWF.load_manifest(manifest_path(settings))
+		if settings['incremental'] and publishECMWF.is_published(manifest, run_key, termins) and \
+				all(os.path.exists(path) for path in sum(paths, [])) and \
+				all(os.path.exists(hub_path + '.OK') for hub_path in hub_paths):
+			print('Model run %s is already published for all stations, nothing to do' %run_key)
+			return []
+
+		#construct the station x lead time x variable array from the parsed station forecasts
+		if hub_paths or any(output.layout == 'sites' for output in outputs):
+			with statsECMWF.stage(report, 'assemble'):
+				run_dt, leads, cube = assemble(results)
+
+		published = []
+		with statsECMWF.stage(report, 'publish'):
+			for nOut, output in enumerate(outputs):
+				#one hub file per requested variable in the run directory
+				if output.layout == 'hub':
+					import hubECMWF
+					for nVar, hub_path in zip(output.vars, paths[nOut]):
+						with publishECMWF.atomic_write(hub_path) as hubopen:
+							hubECMWF.save_hub(hubopen, leads, cube, nVar)
+						print('Saved %s hub file to directory %s ' %(settings['var_names'][nVar], hub_path))
+						with publishECMWF.atomic_write(hub_path + '.OK'):			#marker only after the hub file is in place
+							pass
+
+				#forecasts interpolated to turbine sites, wind speed at hub height
+				elif output.layout == 'sites':
+					import hubECMWF
+					import interpECMWF
+					opts = output.options
+					first, point = fetchECMWF.unique_points(lat, lon)					#co-located stations count once
+					index, weight = interpECMWF.site_weights([lat[n] for n in first], [lon[n] for n in first],
+						opts['sites'], opts['method'], opts['weights_dir'], **opts['params'])
+					names = [settings['var_names'][nVar] for nVar in output.vars]
+					circular = [n for n, name in enumerate(names) if name == 'windDirection']
+					site_cube = interpECMWF.interpolate(index, weight, cube[first][:,:,output.vars], circular)
+					for n, name in enumerate(names):
+						if name == 'windSpeed':
+							site_cube[:,:,n] = interpECMWF.wind_profile(site_cube[:,:,n], opts['sites'].height, opts['profile'], opts['alpha'], opts['z0'])
+					if not os.path.isdir(output.dir + run_key):
+						os.makedirs(output.dir + run_key)
+					for n, site_path in enumerate(paths[nOut]):
+						with publishECMWF.atomic_write(site_path) as siteopen:
+							hubECMWF.save_hub(siteopen, leads, site_cube, n)
+						print('Saved %s file for %d sites to %s ' %(names[n], len(opts['sites'].names), site_path))
+
+				#station (and precipitation) csv files filed by station, year and month
+				elif output.layout == 'csv':
+					import shutil
+					for save_path in paths[nOut]:
+						if not os.path.isdir(os.path.dirname(save_path)):
+							os.makedirs(os.path.dirname(save_path))
+						csvname = settings['run_dir'] + os.path.basename(save_path)
+						with publishECMWF.atomic_write(save_path, 'wb') as saveopen:
+							shutil.copyfileobj(open(csvname, 'rb'), saveopen)
+						print('Copying file %s to directory %s ' %(csvname, save_path))
+
+				#columnar copy of the whole run for binary consumers
+				elif output.layout == 'columnar':
+					import storeECMWF
+					storeECMWF.write_run(paths[nOut][0], results, stations, lat, lon, settings['var_names'])
+					print('Saved columnar run file to %s ' %paths[nOut][0])
+
+				#history archive: runs already ingested are skipped
+				elif output.layout == 'history':
+					import historyECMWF
+					added = historyECMWF.ingest(output.dir, results, settings['var_names'])
+					print('Added %d records to history archive %s ' %(added, output.dir))
+				published.extend(paths[nOut])
+
+			publishECMWF.update_manifest(manifest_path(settings), run_key, run_dt, termins, published)
+	return published
+
+
+def write_report(settings, report):
+	"""Write the run report in the requested formats."""
+	if settings['report_json']:
+		statsECMWF.write_json(report, settings['report_json'])
+	if settings['report_prom']:
+		statsECMWF.write_prometheus(report, settings['report_prom'])
+
+
+def main(argv=None):
+	"""Command line entry point: fetch, convert and publish all stations in one pass."""
+	import argparse
+	import configECMWF
+	parser = argparse.ArgumentParser(description='Get ECMWF point forecasts from api.yr.no and publish csv/hub files.')
+	parser.add_argument('-c', '--config', help='ini file with stations, variables, settings and outputs (see configECMWF.py)')
+	parser.add_argument('--cfg-file', help='station file (default: %s)' %cfg_file)
+	parser.add_argument('--data-dir', help='output directory (default: %s)' %data_dir)
+	parser.add_argument('--run-dir', help='working directory for station files (default: %s)' %run_dir)
+	parser.add_argument('--api-url')
+	parser.add_argument('--fetch-workers', type=int)
+	parser.add_argument('--convert-workers', type=int)
+	args = parser.parse_args(argv)
+
+	#input block, then the config file, then the command line
+	try:
+		settings = default_settings()
+		stations, outputs = None, []
+		if args.config:
+			settings, stations, outputs = configECMWF.load_config(args.config, settings)
+		settings.update((key, value) for key, value in vars(args).items() if key in INPUTS and value is not None)
+		check_settings(settings)
+		if stations is None:
+			stations = configECMWF.read_stations(settings['cfg_file'])
+	except ValueError as e:
+		sys.exit(str(e))
+	outputs = [output._replace(dir=output.dir or settings['data_dir']) for output in outputs] or \
+		configECMWF.default_outputs(settings)
+	stations, lat, lon = stations
+
+	report = statsECMWF.new_report()
+	results = fetch(settings, stations, lat, lon, report)
+	log_results(settings, stations, results)
+	if not any(results):
+		write_report(settings, report)
+		sys.exit('No station data was retrieved, nothing to assemble')
+	publish(settings, stations, lat, lon, results, report, outputs)
+	write_report(settings, report)
+	print('======================COMPLETE========================')
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,175 @@
+#===================
+# historyECMWF.py
+#===================
+"""
+***meta***
+Append-only archive of every ingested model run, indexed by (station, run time, lead hour).
+
+Layout of history_dir:
+	variables.txt		variable names, fixed when the archive is created
+	stations.txt		station names; a station's number is its line number
+	index.bin			one INDEX_DTYPE record (station, run, lead) per forecast record
+	values.bin			float32 values, one row of len(variables) per index record
+	runs.bin			one RUNS_DTYPE entry (station, run, first record, record count)
+						per ingested station run
+
+Records are only ever appended: values first, then the matching index records, then
+the runs.bin entry, so runs.bin is the commit point and records left over by an
+interrupted ingest are dropped on the next one. runs.bin is small (one entry per station
+and model run), so the duplicate check on ingest and the station/run selection of
+query() read only it, and then seek straight to the record ranges they need in the
+memory-mapped index and values files.
+"""
+
+import os
+import numpy as np
+import hubECMWF
+import publishECMWF
+
+INDEX_DTYPE = np.dtype([('station', '<i4'), ('run', '<M8[s]'), ('lead', '<i4')])
+RUNS_DTYPE = np.dtype([('station', '<i4'), ('run', '<M8[s]'), ('start', '<i8'), ('count', '<i4')])
+
+
+def _read_lines(path):
+	if not os.path.exists(path):
+		return []
+	return [line.strip() for line in open(path) if line.strip()]
+
+
+def _paths(history_dir):
+	return [os.path.join(history_dir, name) for name in ('variables.txt', 'stations.txt', 'index.bin', 'values.bin', 'runs.bin')]
+
+
+def _check_variables(history_dir, var_names):
+	"""Create the archive with var_names, or make sure it already holds exactly those."""
+	var_file = _paths(history_dir)[0]
+	stored = _read_lines(var_file)
+	if not stored:
+		varopen = open(var_file, 'w')
+		varopen.write('\n'.join(var_names) + '\n')
+		varopen.close()
+	elif stored != list(var_names):
+		raise ValueError('History archive %s holds variables %s, not %s' %(history_dir, stored, list(var_names)))
+
+
+def _truncate(path, size):
+	if os.path.exists(path) and os.path.getsize(path) != size:
+		fileopen = open(path, 'r+b')
+		fileopen.truncate(size)
+		fileopen.close()
+
+
+def _committed(history_dir, nvar):
+	"""Committed station runs (RUNS_DTYPE array); trims index and values records written after the last one."""
+	var_file, stn_file, index_file, values_file, runs_file = _paths(history_dir)
+	nruns = os.path.getsize(runs_file) // RUNS_DTYPE.itemsize if os.path.exists(runs_file) else 0
+	_truncate(runs_file, nruns * RUNS_DTYPE.itemsize)
+	runs = np.fromfile(runs_file, dtype=RUNS_DTYPE, count=nruns) if nruns else np.empty(0, RUNS_DTYPE)
+	nrec = int(runs['start'][-1] + runs['count'][-1]) if len(runs) else 0
+	_truncate(index_file, nrec * INDEX_DTYPE.itemsize)
+	_truncate(values_file, nrec * 4 * nvar)
+	return runs
+
+
+def ingest(history_dir, forecasts, var_names):
+	"""
+	Append parsed forecasts (parseECMWF.Forecast, None entries are skipped) to the archive.
+
+	A (station, run) pair that is already archived is not added again, so the same run
+	can be ingested repeatedly, also by overlapping runs. Returns the number of records added.
+	"""
+	try:
+		os.makedirs(history_dir)
+	except OSError:
+		if not os.path.isdir(history_dir):
+			raise
+	with publishECMWF.lock(os.path.join(history_dir, 'ingest.lock')):			#one writer at a time
+		_check_variables(history_dir, var_names)
+		var_file, stn_file, index_file, values_file, runs_file = _paths(history_dir)
+		runs = _committed(history_dir, len(var_names))
+		nrec = int(runs['start'][-1] + runs['count'][-1]) if len(runs) else 0
+		archived = set(zip(runs['station'].tolist(), runs['run'].astype('int64').tolist()))
+		stations = _read_lines(stn_file)
+		numbers = dict((stn, nStn) for nStn, stn in enumerate(stations))
+
+		added = 0
+		stnopen = open(stn_file, 'a')
+		valopen = open(values_file, 'ab')
+		idxopen = open(index_file, 'ab')
+		runsopen = open(runs_file, 'ab')
+		for fcst in forecasts:
+			if fcst is None or not len(fcst.times):
+				continue
+			if fcst.stn not in numbers:
+				numbers[fcst.stn] = len(numbers)
+				stnopen.write(fcst.stn + '\n')
+				stnopen.flush()
+			run = np.datetime64(fcst.run_dt, 's')
+			if (numbers[fcst.stn], int(run.astype('int64'))) in archived:
+				continue															#already archived
+			records = np.empty(len(fcst.times), dtype=INDEX_DTYPE)
+			records['station'] = numbers[fcst.stn]
+			records['run'] = run
+			records['lead'] = hubECMWF.lead_hours(fcst.times, fcst.run_dt)
+			entry = np.array([(numbers[fcst.stn], run, nrec, len(records))], dtype=RUNS_DTYPE)
+			valopen.write(fcst.values.astype('<f4').tobytes())
+			valopen.flush()
+			idxopen.write(records.tobytes())
+			idxopen.flush()
+			runsopen.write(entry.tobytes())										#commit
+			runsopen.flush()
+			archived.add((numbers[fcst.stn], int(run.astype('int64'))))
+			nrec = nrec + len(records)
+			added = added + len(records)
+		stnopen.close()
+		valopen.close()
+		idxopen.close()
+		runsopen.close()
+	return added
+
+
+def query(history_dir, station=None, lead=None, start=None, end=None):
+	"""
+	Select archived records; every argument left as None matches everything.
+
+	station is a name, lead an hour or a list of hours, start/end bound the run time
+	(datetime, inclusive). Returns a dict of arrays in archive order: station (names),
+	run (datetime64[s]), lead, values [record, variable] and var_names.
+	"""
+	var_file, stn_file, index_file, values_file, runs_file = _paths(history_dir)
+	var_names = _read_lines(var_file)
+	stations = np.array(_read_lines(stn_file))
+	nruns = os.path.getsize(runs_file) // RUNS_DTYPE.itemsize if os.path.exists(runs_file) else 0
+	runs = np.fromfile(runs_file, dtype=RUNS_DTYPE, count=nruns) if nruns else np.empty(0, RUNS_DTYPE)
+
+	#pick the station runs first, then read only their record ranges
+	mask = np.ones(len(runs), dtype=bool)
+	if station is not None:
+		matches = np.nonzero(stations == station)[0]
+		mask &= runs['station'] == (matches[0] if len(matches) else -1)
+	if start is not None:
+		mask &= runs['run'] >= np.datetime64(start, 's')
+	if end is not None:
+		mask &= runs['run'] <= np.datetime64(end, 's')
+	picked = runs[mask]
+	counts = picked['count'].astype(np.int64)
+	rows = np.repeat(picked['start'] - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+	if len(rows):
+		nrec = int(runs['start'][-1] + runs['count'][-1])
+		index = np.memmap(index_file, dtype=INDEX_DTYPE, mode='r', shape=(nrec,))
+		values = np.memmap(values_file, dtype='<f4', mode='r', shape=(nrec, len(var_names)))
+		selected = np.array(index[rows])
+		if lead is not None:
+			keep = np.isin(selected['lead'], np.atleast_1d(lead))
+			rows, selected = rows[keep], selected[keep]
+		selected_values = np.array(values[rows])
+	else:
+		selected = np.empty(0, INDEX_DTYPE)
+		selected_values = np.empty((0, len(var_names)), dtype='<f4')
+	return {
+		'station': stations[selected['station']] if len(selected) else np.array([], dtype=stations.dtype),
+		'run': selected['run'],
+		'lead': selected['lead'],
+		'values': selected_values,
+		'var_names': var_names,
+	}
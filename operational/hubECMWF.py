@@ -0,0 +1,74 @@
+#===================
+# hubECMWF.py
+#===================
+"""
+***meta***
+Assembles cross-station hub files from forecasts already parsed in memory.
+
+All requested variables go into a single (station x lead time x variable) array from
+one parse pass; each <VAR>.1.t hub file is then a single savetxt of one slice of it.
+
+Rows are forecast-hour offsets from the model run start, computed with datetime64
+arithmetic; each station is placed on that axis by exact lead-time match, so a
+station with missing or extra records shows up as NaN rather than shifting rows.
+The run is the newest model run among the stations; a station still on an older run
+is left out (NaN) rather than shifted onto the axis.
+"""
+
+import numpy as np
+
+
+def lead_hours(times, run_dt):
+	"""Whole-hour offsets of datetime64 valid times from the run start (truncated like int())."""
+	return ((times - np.datetime64(run_dt, 's')) / np.timedelta64(1, 'h')).astype(int)
+
+
+def reference_run(forecasts):
+	"""Model run start of the run being assembled: the newest among the available forecasts."""
+	available = [fcst.run_dt for fcst in forecasts if fcst is not None]
+	if not available:
+		raise ValueError('No station forecasts to assemble')
+	return max(available)
+
+
+def assemble_cube(forecasts):
+	"""
+	Build the (station x lead time x variable) forecast array from parsed forecasts.
+
+	forecasts is a list of parseECMWF.Forecast in station order, with None for stations
+	without data. Only stations on reference_run() are used; the lead-time axis is the
+	union of their lead hours. Returns (run_dt, leads, cube) with NaN wherever a station
+	has no record, and for every station on another model run.
+	"""
+	run_dt = reference_run(forecasts)
+	offsets = [None] * len(forecasts)
+	for nStn, fcst in enumerate(forecasts):
+		if fcst is None:
+			continue
+		if fcst.run_dt != run_dt:
+			print('WARNING: %s is from model run %s, not %s. Left out of the hub files.' %(fcst.stn, fcst.run_dt, run_dt))
+			continue
+		offsets[nStn] = lead_hours(fcst.times, run_dt)
+	leads = np.unique(np.concatenate([off for off in offsets if off is not None]))
+
+	nvar = [fcst for fcst in forecasts if fcst is not None][0].values.shape[1]
+	cube = np.empty((len(forecasts), len(leads), nvar)) * np.nan					#preallocate, NaN where no data
+	for nStn, fcst in enumerate(forecasts):
+		if offsets[nStn] is None:
+			continue
+		rows = np.searchsorted(leads, offsets[nStn])							#exact: every offset is on the axis
+		cube[nStn,rows,:] = fcst.values
+		if len(rows) != len(leads):
+			print('WARNING: %s has %d of %d lead times, missing rows left as NaN' %(fcst.stn, len(rows), len(leads)))
+	return run_dt, leads, cube
+
+
+def hub_matrix(leads, cube, nVar):
+	"""Hub layout for one variable: [lead hour, station 1, station 2, ...]."""
+	return np.column_stack((leads, cube[:,:,nVar].T))
+
+
+def save_hub(fname, leads, cube, nVar):
+	"""Write one variable's hub file (path or open file) in the legacy text format (%d lead hour, %f per station)."""
+	row_format = ['%d'] + ['%f'] * cube.shape[0]
+	np.savetxt(fname, hub_matrix(leads, cube, nVar), fmt=row_format, delimiter=' ')
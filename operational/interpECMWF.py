@@ -0,0 +1,168 @@
+#===================
+# interpECMWF.py
+#===================
+"""
+***meta***
+Interpolation of the fetched station forecasts to turbine sites and hub heights.
+
+Horizontal weights map the (station x lead time x variable) cube onto any number of
+sites in one batched product, so a new turbine costs no extra request:
+	idw			inverse-distance weighting over the nearest stations (great-circle distance)
+	bilinear	bilinear weights, for stations requested on a regular lat/lon grid
+Both give a (site x neighbour) pair of station index and weight arrays. Weights depend
+only on the coordinates, so site_weights() keeps them in weights_<key>.npz and reuses
+them for every run until the stations or sites change.
+
+Wind speed (10 m in the locationforecast) is then brought to each site's hub height with
+a power law, v(z) = v10 (z / 10) ** alpha, or a log profile, v(z) = v10 ln(z / z0) / ln(10 / z0).
+"""
+
+import os, hashlib
+from collections import namedtuple
+import numpy as np
+import publishECMWF
+
+Sites = namedtuple('Sites', ['names', 'lat', 'lon', 'height'])
+
+EARTH_RADIUS = 6371.																	#km
+REF_HEIGHT = 10.																		#m, height of the forecast wind speed
+MIN_DISTANCE = 1e-6																	#km, closer counts as on the station
+
+
+def read_sites(path, height_column=4):
+	"""
+	Turbine sites from a whitespace separated file: name, lat, lon and the hub height (m)
+	in column height_column (0-based; 4 reads the hub height column of wpVerif2.cfg).
+	"""
+	names, lat, lon, height = [], [], [], []
+	for line in open(path):
+		fields = line.split('#')[0].split()
+		if not fields:
+			continue
+		if len(fields) <= max(2, height_column):
+			raise ValueError('Please ensure that latitude/longitude/height information is complete for all sites')
+		names.append(fields[0])
+		lat.append(float(fields[1]))
+		lon.append(float(fields[2]))
+		height.append(float(fields[height_column]))
+	return Sites(names, np.array(lat), np.array(lon), np.array(height))
+
+
+def distances(src_lat, src_lon, dst_lat, dst_lon):
+	"""Great-circle distance (km) from every destination to every source: [dst, src]."""
+	src_lat, src_lon, dst_lat, dst_lon = [np.radians(np.asarray(deg, dtype=float)) for deg in (src_lat, src_lon, dst_lat, dst_lon)]
+	dlat = dst_lat[:,None] - src_lat[None,:]
+	dlon = dst_lon[:,None] - src_lon[None,:]
+	a = np.sin(dlat / 2.)**2 + np.cos(dst_lat)[:,None] * np.cos(src_lat)[None,:] * np.sin(dlon / 2.)**2
+	return 2. * EARTH_RADIUS * np.arcsin(np.sqrt(np.minimum(a, 1.)))
+
+
+def idw_weights(src_lat, src_lon, dst_lat, dst_lon, power=2., neighbours=4):
+	"""Inverse-distance weights over the nearest neighbours stations: (index, weight), both [dst, k]."""
+	dist = distances(src_lat, src_lon, dst_lat, dst_lon)
+	k = min(neighbours, dist.shape[1])
+	index = np.argsort(dist, axis=1)[:,:k]
+	near = dist[np.arange(len(dist))[:,None], index]
+	weight = 1. / np.maximum(near, MIN_DISTANCE)**power							#a site on a station takes its value
+	return index, weight / weight.sum(axis=1)[:,None]
+
+
+def bilinear_weights(src_lat, src_lon, dst_lat, dst_lon):
+	"""
+	Bilinear weights from stations on a regular lat/lon grid: (index, weight), both [dst, 4].
+
+	Every lat/lon combination must be a station; sites outside the grid are clamped to its edge.
+	"""
+	src_lat, src_lon = np.asarray(src_lat, dtype=float), np.asarray(src_lon, dtype=float)
+	lats, lons = np.unique(src_lat), np.unique(src_lon)
+	if len(lats) < 2 or len(lons) < 2:
+		raise ValueError('Bilinear interpolation needs at least a 2 x 2 grid of stations')
+	node = -np.ones((len(lats), len(lons)), dtype=int)
+	node[np.searchsorted(lats, src_lat), np.searchsorted(lons, src_lon)] = np.arange(len(src_lat))
+	if (node < 0).any():
+		raise ValueError('Stations do not form a complete lat/lon grid, use idw weights instead')
+	dst_lat = np.clip(np.asarray(dst_lat, dtype=float), lats[0], lats[-1])
+	dst_lon = np.clip(np.asarray(dst_lon, dtype=float), lons[0], lons[-1])
+	i = np.clip(np.searchsorted(lats, dst_lat) - 1, 0, len(lats) - 2)
+	j = np.clip(np.searchsorted(lons, dst_lon) - 1, 0, len(lons) - 2)
+	ty = (dst_lat - lats[i]) / (lats[i+1] - lats[i])
+	tx = (dst_lon - lons[j]) / (lons[j+1] - lons[j])
+	index = np.column_stack((node[i,j], node[i,j+1], node[i+1,j], node[i+1,j+1]))
+	weight = np.column_stack(((1 - ty) * (1 - tx), (1 - ty) * tx, ty * (1 - tx), ty * tx))
+	return index, weight
+
+
+METHODS = {'idw': idw_weights, 'bilinear': bilinear_weights}
+
+
+def site_weights(src_lat, src_lon, sites, method='idw', cache_dir='', **params):
+	"""
+	Horizontal weights from the stations to sites, reused from cache_dir when the stations,
+	sites, method and params are unchanged ('' computes them every time).
+	"""
+	if method not in METHODS:
+		raise ValueError('Unknown interpolation method %s, use one of %s' %(method, ', '.join(sorted(METHODS))))
+	path = None
+	if cache_dir:
+		key = hashlib.sha1()
+		for coords in (src_lat, src_lon, sites.lat, sites.lon):
+			key.update(np.ascontiguousarray(coords, dtype=float).tobytes())
+		key.update(repr((method, sorted(params.items()))).encode('utf-8'))
+		path = os.path.join(cache_dir, 'weights_' + key.hexdigest()[:16] + '.npz')
+		if os.path.exists(path):
+			data = np.load(path)
+			return data['index'], data['weight']
+	index, weight = METHODS[method](src_lat, src_lon, sites.lat, sites.lon, **params)
+	if path is not None:
+		if not os.path.isdir(cache_dir):
+			os.makedirs(cache_dir)
+		with publishECMWF.atomic_write(path, 'wb') as tmpfile:
+			np.savez(tmpfile, index=index, weight=weight)
+	return index, weight
+
+
+def interpolate(index, weight, cube, circular=()):
+	"""
+	Apply site weights to a (station x lead time x variable) cube: returns [site, lead, var].
+
+	Stations without data (NaN) drop out and the remaining weights are renormalized; a site
+	is NaN only where none of its stations has data. Variables listed in circular (indices,
+	degrees, e.g. wind direction) are averaged as unit vectors.
+	"""
+	cube = np.asarray(cube, dtype=float)
+	circular = list(circular)
+	if circular:
+		angle = np.radians(cube[:,:,circular])
+		cube = np.concatenate((cube, np.sin(angle), np.cos(angle)), axis=2)
+	total = np.zeros((len(index),) + cube.shape[1:])
+	sites = np.zeros((len(index),) + cube.shape[1:])
+	for k in range(index.shape[1]):													#one neighbour at a time, all sites at once
+		near = cube[index[:,k]]
+		valid = ~np.isnan(near)
+		w = weight[:,k,None,None] * valid
+		sites += w * np.where(valid, near, 0.)
+		total += w
+	with np.errstate(invalid='ignore', divide='ignore'):
+		sites = sites / total
+	if circular:
+		nvar = cube.shape[2] - 2 * len(circular)
+		sin, cos = sites[:,:,nvar:nvar+len(circular)], sites[:,:,nvar+len(circular):]
+		sites = sites[:,:,:nvar]
+		sites[:,:,circular] = (np.degrees(np.arctan2(sin, cos)) + 360.) % 360.
+	return sites
+
+
+def wind_profile(speed, height, profile='power', alpha=1/7., z0=0.03, ref_height=REF_HEIGHT):
+	"""
+	Wind speed at height (m, one per site) from speed at ref_height, [site, ...] arrays.
+
+	profile is 'power' (exponent alpha), 'log' (roughness length z0, m) or 'none'.
+	"""
+	height = np.asarray(height, dtype=float).reshape((-1,) + (1,) * (np.ndim(speed) - 1))
+	if profile == 'power':
+		return speed * (height / ref_height)**alpha
+	elif profile == 'log':
+		return speed * np.log(height / z0) / np.log(ref_height / z0)
+	elif profile == 'none':
+		return speed
+	raise ValueError('Unknown wind profile %s, use power, log or none' %profile)
@@ -0,0 +1,192 @@
+#===================
+# parseECMWF.py
+#===================
+"""
+***meta***
+Streaming converter from locationforecast XML to per-station csv.
+
+The document is read with iterparse, so each <time> element is turned into a csv row
+as soon as it closes and is then cleared, keeping memory flat regardless of the
+forecast horizon. All requested variables are picked up in a single walk over each
+element's descendants instead of one './/var' search per variable.
+
+Expected layout (yr.no locationforecast 1.9):
+	<weatherdata>
+		<meta><model termin="2016-02-10T00:00:00Z" .../></meta>
+		<product>
+			<time from="..." to="..."><location ...><windSpeed mps="4.4" .../>...</location></time>
+			...
+"""
+
+import csv
+import datetime
+import collections
+import io
+import numpy as np
+try:
+	from xml.etree import cElementTree as etree									#C parser on python 2.7
+except ImportError:
+	from xml.etree import ElementTree as etree
+
+
+#parsed forecast for one station: run start, csv written, valid times (datetime64[s]) and
+#float values [record, variable] for every complete record, in file order, plus the
+#precipitation intervals (PRECIP_DTYPE array, None unless requested)
+Forecast = collections.namedtuple('Forecast', ['stn', 'run_dt', 'csvname', 'times', 'values', 'precip'])
+
+#one precipitation interval: start, end and amount (mm)
+PRECIP_DTYPE = [('from', 'datetime64[s]'), ('to', 'datetime64[s]'), ('value', 'float32')]
+
+
+def iterforecast(source, var_names, var_attr, precip=False):
+	"""
+	Stream a locationforecast document from a filename or file-like object.
+
+	Yields the model run start string (termin of the first <model>) first, then a
+	(from, to, values, precip) tuple for every <time> element, where values holds the
+	requested attribute strings in var_names order and None for absent variables, and
+	precip lists the value of every <precipitation> in the element (empty unless
+	precip is set).
+	"""
+	index = dict((var, nVar) for nVar, var in enumerate(var_names))				#variable name -> column
+	termin = None
+	product = None
+	for event, elem in etree.iterparse(source, events=('start', 'end')):
+		if event == 'start':
+			if elem.tag == 'product':
+				product = elem													#keep the parent so finished records can be dropped
+			continue
+		if elem.tag == 'model' and termin is None:
+			termin = elem.attrib['termin']
+			yield termin
+		elif elem.tag == 'time':
+			if termin is None:
+				raise ValueError('No <model termin=...> metadata before forecast records')
+			values = [None] * len(var_names)
+			precip_vals = []
+			for child in elem.iter():											#single pass over all descendants
+				nVar = index.get(child.tag)
+				if nVar is not None and values[nVar] is None:
+					values[nVar] = child.attrib[var_attr[nVar]]
+				elif precip and child.tag == 'precipitation':
+					precip_vals.append(child.attrib['value'])
+			yield elem.attrib['from'], elem.attrib['to'], values, precip_vals
+			elem.clear()
+			if product is not None:
+				product.clear()													#release records already converted
+
+
+def complete_rows(records, precip_rows=None):
+	"""
+	Keep records with every requested variable present, as [from, value, ...] string rows.
+
+	If precip_rows is a list, [from, to, value] precipitation rows from the same records
+	are appended to it as they pass, and checked against the number of <precipitation>
+	elements seen once the records are exhausted.
+	"""
+	prp_cnt = 0
+	for fcst_from, fcst_to, values, precip in records:
+		if precip_rows is not None and precip:
+			prp_cnt = prp_cnt + len(precip)
+			precip_rows.append([fcst_from, fcst_to, precip[0]])
+		if None not in values:													#check that no data is missing
+			yield [fcst_from] + values
+	if precip_rows is not None and len(precip_rows) != prp_cnt:
+		print('WARNING: Mismatch between nubmer of records and timestamps. [stamps: ' + str(prp_cnt) + ', vals: ' + str(len(precip_rows)) + ']')
+
+
+def precip_intervals(precip_rows):
+	"""Pack [from, to, value] string rows into a compact PRECIP_DTYPE array."""
+	intervals = np.empty(len(precip_rows), dtype=PRECIP_DTYPE)
+	intervals['from'] = [row[0][:19] for row in precip_rows]
+	intervals['to'] = [row[1][:19] for row in precip_rows]
+	intervals['value'] = [float(row[2]) for row in precip_rows]
+	return intervals
+
+
+def csv_name(run_dir, run_dt, stn):
+	"""Station csv written for a model run; its precipitation csv has 'precip' prepended to the base name."""
+	return run_dir + run_dt.strftime('%Y-%m-%d_%H%M') + '_' + stn + '.csv'
+
+
+def write_csv(meta_time, rows, stn, run_dir, var_names, var_units, precip_rows=None):
+	"""
+	Write string rows to <run_dir><YYYY-mm-dd_HHMM>_<stn>.csv as they come.
+
+	The same rows are returned already parsed as a Forecast, so nothing needs to
+	re-read the csv. If precip_rows is given (it may be filled while rows is consumed)
+	it is written once afterwards to <run_dir>precip<YYYY-mm-dd_HHMM>_<stn>.csv.
+	With run_dir None nothing is written and only the Forecast is built.
+	"""
+	run_dt = datetime.datetime.strptime(meta_time, '%Y-%m-%dT%H:%M:%SZ')		#convert to datetime object
+	csvname = None
+	if run_dir is not None:
+		csvname = csv_name(run_dir, run_dt, stn)									#generate filename
+		csvopen = open(csvname, 'w')
+		csvwrite = csv.writer(csvopen)
+		csvwrite.writerow(['Timestamp'] + [var_names[i] + var_units[i] for i in range(len(var_names))])
+	times = []
+	values = []
+	for row in rows:
+		if csvname is not None:
+			csvwrite.writerow(row)
+		times.append(row[0][:19])												#drop the 'Z', datetime64 is naive UTC
+		values.append([float(val) for val in row[1:]])
+	if csvname is not None:
+		csvopen.close()
+	times = np.array(times, dtype='datetime64[s]')
+	values = np.array(values, dtype=float).reshape(len(times), len(var_names))
+	precip = None
+	if precip_rows is not None:
+		precip = precip_intervals(precip_rows)
+	if precip_rows is not None and run_dir is not None:
+		csvname_p = csv_name(run_dir + 'precip', run_dt, stn)
+		csvopen_p = open(csvname_p, 'w')
+		csvwrite_p = csv.writer(csvopen_p)
+		csvwrite_p.writerow(['from', 'to', 'precipitation (mm)'])
+		csvwrite_p.writerows(precip_rows)
+		csvopen_p.close()
+	return Forecast(stn, run_dt, csvname, times, values, precip)
+
+
+def xml_to_csv(source, stn, run_dir, var_names, var_attr, var_units, skip_run=None, precip=False):
+	"""
+	Convert one station's forecast to <run_dir><YYYY-mm-dd_HHMM>_<stn>.csv, streaming.
+
+	Only records with every requested variable present are written; with precip set,
+	precipitation intervals are collected in the same pass and written alongside. If
+	the model run start (termin string) equals skip_run, parsing stops right after the
+	metadata and None is returned without writing anything.
+	"""
+	records = iterforecast(source, var_names, var_attr, precip)
+	meta_time = next(records)
+	if meta_time == skip_run:
+		records.close()
+		return None
+	precip_rows = [] if precip else None
+	rows = complete_rows(records, precip_rows)
+	return write_csv(meta_time, rows, stn, run_dir, var_names, var_units, precip_rows)
+
+
+def parse_records(source, var_names, var_attr, skip_run=None, precip=False):
+	"""
+	Parse a whole station document into plain data, without writing anything.
+
+	Returns (meta_time, rows, precip_rows) with the string rows of complete records and
+	of precipitation intervals (None unless precip is set), ready for write_csv, or None
+	if meta_time equals skip_run. Results are picklable, so this is what process-pool
+	workers run.
+	"""
+	records = iterforecast(source, var_names, var_attr, precip)
+	meta_time = next(records)
+	if meta_time == skip_run:
+		records.close()
+		return None
+	precip_rows = [] if precip else None
+	rows = list(complete_rows(records, precip_rows))
+	return meta_time, rows, precip_rows
+
+
+def parse_bytes(data, var_names, var_attr, skip_run=None, precip=False):
+	"""parse_records on a document already held in memory."""
+	return parse_records(io.BytesIO(data), var_names, var_attr, skip_run, precip)
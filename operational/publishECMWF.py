@@ -0,0 +1,126 @@
+#===================
+# publishECMWF.py
+#===================
+"""
+***meta***
+Bookkeeping for published model runs.
+
+The manifest is a small json file mapping each published run (yymmddHH) to the model
+run start, the stations whose data went into its hub file (with the model run each
+supplied) and when it was written. A run that is already published for every station
+with data from that same model run is skipped, so repeated cron polls of an unchanged
+model run are a clean no-op; a station that was still on an older run keeps the run
+unpublished until its data for the run has gone out.
+
+Published files are replaced atomically: atomic_write() writes to a temporary file
+unique to the writing process and thread, fsyncs it and renames it over the target, so
+a consumer polling for WND_HUB.1.t (or its .OK marker) sees the old file or the new
+one, never a partial one. lock() serializes runs that overlap: publishing holds the
+manifest's lock file (<manifest>.lock) from the published check to the manifest update.
+
+lock() takes POSIX record locks (fcntl.lockf), which NFS passes to the server's lock
+manager, so runs on different hosts sharing data_dir exclude each other as long as the
+mount has locking enabled (not with the nolock/local_lock options). The locks belong to
+the process: threads of one run do not exclude each other.
+"""
+
+import os, json, fcntl, datetime, contextlib, threading
+
+
+def _fsync_dir(path):
+	"""Make a rename in the directory of path durable."""
+	try:
+		dirfd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+	except OSError:
+		return
+	try:
+		os.fsync(dirfd)
+	except OSError:
+		pass																	#not supported for directories everywhere
+	finally:
+		os.close(dirfd)
+
+
+@contextlib.contextmanager
+def atomic_write(path, mode='w'):
+	"""Open a temporary file to write; it replaces path only if the block completes."""
+	tmp_path = '%s.tmp%d.%d' %(path, os.getpid(), threading.current_thread().ident)
+	tmpfile = open(tmp_path, mode)
+	try:
+		yield tmpfile
+		tmpfile.flush()
+		os.fsync(tmpfile.fileno())
+		tmpfile.close()
+		os.rename(tmp_path, path)
+	except BaseException:
+		tmpfile.close()
+		os.remove(tmp_path)
+		raise
+	_fsync_dir(path)
+
+
+@contextlib.contextmanager
+def lock(path):
+	"""Hold an exclusive lock on path (waits for other processes; the file is left in place)."""
+	lockfile = open(path, 'a')
+	try:
+		fcntl.lockf(lockfile.fileno(), fcntl.LOCK_EX)
+		yield
+	finally:
+		lockfile.close()														#releases the lock
+
+
+def load_manifest(manifest_file):
+	"""Read the manifest of published runs (empty if it does not exist yet)."""
+	if not os.path.exists(manifest_file):
+		return {}
+	try:
+		return json.load(open(manifest_file))
+	except ValueError:
+		print('WARNING: unreadable manifest %s, treating every run as unpublished' %manifest_file)
+		return {}
+
+
+def is_published(manifest, run_key, termins):
+	"""
+	True if run_key was already published with data for all stations in termins
+	({station: model run start it supplied}, as '%Y-%m-%dT%H:%M:%SZ').
+
+	A station on another model run than run_key never counts as published.
+	"""
+	entry = manifest.get(run_key)
+	if entry is None:
+		return False
+	return all(entry['stations'].get(stn) == termin == entry['termin'] for stn, termin in termins.items())
+
+
+def record_published(manifest, run_key, run_dt, termins, files):
+	"""Add (or replace) the manifest entry for a freshly published run; only stations on run_dt are recorded."""
+	termin = run_dt.strftime('%Y-%m-%dT%H:%M:%SZ')
+	manifest[run_key] = {
+		'termin': termin,
+		'stations': dict((stn, stn_termin) for stn, stn_termin in termins.items() if stn_termin == termin),
+		'files': list(files),
+		'published': datetime.datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ'),
+	}
+
+
+def save_manifest(manifest, manifest_file):
+	"""Write the manifest back to disk."""
+	with atomic_write(manifest_file) as manifestopen:
+		json.dump(manifest, manifestopen, indent=1, sort_keys=True)
+
+
+def manifest_lock(manifest_file):
+	"""The one lock file for publishing against manifest_file, next to it."""
+	return manifest_file + '.lock'
+
+
+def update_manifest(manifest_file, run_key, run_dt, termins, files):
+	"""
+	Record a published run, re-reading the manifest so overlapping runs keep each other's
+	entries. Call with lock(manifest_lock(manifest_file)) held.
+	"""
+	manifest = load_manifest(manifest_file)
+	record_published(manifest, run_key, run_dt, termins, files)
+	save_manifest(manifest, manifest_file)
@@ -10,12 +10,14 @@ echo ------------- ECMWF automatic data fetch ----------------
 CURRENT_TIME=$(date +%d-%m-%Y_%H:%M:%S)						#get current timestamp
 
 mkdir -p ./ECMWFlogs										#create logs directory, if doesn't exist
+RUN_DIR=./run/$$											#working directory of this run, so overlapping runs keep apart
+mkdir -p $RUN_DIR
 
 echo ...running getECMWF.py to download and convert data.
-python2.7 ./getECMWF.py 2>&1 | tee "./ECMWFlogs/$CURRENT_TIME.txt"	#run python script, save output
+python2.7 ./getECMWF.py --config ./getECMWF.ini --run-dir $RUN_DIR/ 2>&1 | tee "./ECMWFlogs/$CURRENT_TIME.txt"	#run python script, save output
 
 echo ...removing downloaded xml files
-rm ./run/*													#remove all script files
+rm -r $RUN_DIR												#remove all script files
 
 echo ECMWF download attempt complete: $date
 echo Check status log in ./ECMWFlogs directory
@@ -0,0 +1,105 @@
+#===================
+# statsECMWF.py
+#===================
+"""
+***meta***
+Per-run timing and throughput report for the fetch/convert/assemble/publish pipeline.
+
+The report is a plain dict: wall time per stage, and per station the download latency
+(including retries and, when streaming, the conversion done while reading), body bytes,
+conversion time and records written. summarize() adds run totals, records per second
+and peak memory; the result can be written as json or as a Prometheus textfile for the
+node_exporter textfile collector.
+"""
+
+import sys, time, json, resource, threading, contextlib
+import publishECMWF
+
+_lock = threading.Lock()
+
+
+def new_report():
+	"""Start an empty report for this run."""
+	return {'started': time.time(), 'stages': {}, 'stations': {}}
+
+
+@contextlib.contextmanager
+def stage(report, name):
+	"""Time a block as pipeline stage `name` (repeated blocks add up)."""
+	start = time.time()
+	try:
+		yield
+	finally:
+		report['stages'][name] = report['stages'].get(name, 0.) + time.time() - start
+
+
+def station(report, stn, **fields):
+	"""Record fields for a station; safe to call from download threads."""
+	with _lock:
+		report['stations'].setdefault(stn, {}).update(fields)
+
+
+def peak_rss():
+	"""Peak resident memory in bytes of this process and of its (reaped) children."""
+	scale = 1 if sys.platform == 'darwin' else 1024								#ru_maxrss is kB on linux, bytes on mac
+	own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+	return max(own, children) * scale
+
+
+def summarize(report):
+	"""Run totals derived from the stage and station entries."""
+	stations = report['stations'].values()
+	records = sum(entry.get('records', 0) for entry in stations)
+	convert_s = sum(entry.get('convert_s', 0.) for entry in stations)
+	summary = {
+		'elapsed_s': time.time() - report['started'],
+		'stations': len(report['stations']),
+		'stations_failed': len([entry for entry in stations if entry.get('failed')]),
+		'stations_cached': len([entry for entry in stations if entry.get('cached')]),
+		'bytes': sum(entry.get('bytes', 0) for entry in stations),
+		'records': records,
+		'records_per_s': records / convert_s if convert_s else None,
+		'peak_rss_bytes': peak_rss(),
+	}
+	report['summary'] = summary
+	return summary
+
+
+def _replace(path, text):
+	"""Write text to path through a rename, so readers never see a partial file."""
+	with publishECMWF.atomic_write(path) as reportopen:
+		reportopen.write(text)
+
+
+def write_json(report, path):
+	"""Write the full report as json."""
+	summarize(report)
+	_replace(path, json.dumps(report, indent=1, sort_keys=True))
+
+
+def write_prometheus(report, path):
+	"""Write the report as Prometheus text exposition format (gauges)."""
+	summary = summarize(report)
+	lines = []
+
+	def gauge(name, help, samples):
+		lines.append('# HELP ecmwf_%s %s' %(name, help))
+		lines.append('# TYPE ecmwf_%s gauge' %name)
+		for labels, value in samples:
+			if value is not None:
+				lines.append('ecmwf_%s%s %r' %(name, labels, float(value)))
+
+	gauge('last_run_timestamp_seconds', 'Start time of the last run.', [('', report['started'])])
+	gauge('run_seconds', 'Wall time of the last run.', [('', summary['elapsed_s'])])
+	gauge('stage_seconds', 'Wall time per pipeline stage.',
+		[('{stage="%s"}' %name, seconds) for name, seconds in sorted(report['stages'].items())])
+	for key in ('stations', 'stations_failed', 'stations_cached', 'bytes', 'records', 'records_per_s', 'peak_rss_bytes'):
+		gauge(key, 'Run total: %s.' %key.replace('_', ' '), [('', summary[key])])
+	for field, help in (('fetch_s', 'Download latency per station, including retries.'),
+			('bytes', 'Response body bytes per station.'),
+			('convert_s', 'Conversion time per station.'),
+			('records', 'Records written per station.')):
+		gauge('station_' + field, help, [('{station="%s"}' %stn, entry.get(field))
+			for stn, entry in sorted(report['stations'].items())])
+	_replace(path, '\n'.join(lines) + '\n')
@@ -0,0 +1,83 @@
+#===================
+# storeECMWF.py
+#===================
+"""
+***meta***
+Columnar binary store: one uncompressed .npz per model run holding every station and variable.
+
+Arrays in the file:
+	stations	station names [station]
+	lat, lon	float32 coordinates [station]
+	run			datetime64[s] model run start per station (NaT without data) [station]
+	times		datetime64[s] valid times, union over all stations [time]
+	var_names	variable names [var]
+	values		float32 forecasts, NaN where missing [station, time, var]
+
+np.savez stores members uncompressed, so load_run can memory-map every array straight
+out of the zip file instead of reading it into memory.
+"""
+
+import struct, zipfile
+import numpy as np
+import publishECMWF
+
+
+def write_run(path, forecasts, stations, lat, lon, var_names):
+	"""Write parsed forecasts (list of parseECMWF.Forecast or None, in station order) to path."""
+	available = [fcst for fcst in forecasts if fcst is not None]
+	times = np.unique(np.concatenate([fcst.times for fcst in available]))
+	values = np.empty((len(stations), len(times), len(var_names)), dtype=np.float32)
+	values[:] = np.nan
+	run = np.empty(len(stations), dtype='datetime64[s]')
+	run[:] = np.datetime64('NaT')
+	for nStn, fcst in enumerate(forecasts):
+		if fcst is None:
+			continue
+		values[nStn, np.searchsorted(times, fcst.times)] = fcst.values
+		run[nStn] = np.datetime64(fcst.run_dt, 's')
+	with publishECMWF.atomic_write(path, 'wb') as storeopen:
+		np.savez(storeopen, stations=np.array(stations), lat=np.array(lat, dtype=np.float32),
+			lon=np.array(lon, dtype=np.float32), run=run, times=times,
+			var_names=np.array(var_names), values=values)
+
+
+def _member_offset(storeopen, info):
+	"""Byte offset of a stored zip member's data (after its local file header)."""
+	storeopen.seek(info.header_offset)
+	header = storeopen.read(30)
+	name_len, extra_len = struct.unpack('<HH', header[26:30])
+	return info.header_offset + 30 + name_len + extra_len
+
+
+def load_run(path, mmap_mode='r'):
+	"""
+	Read a run file into a dict of arrays.
+
+	With mmap_mode set (default 'r') every array is an np.memmap onto the file itself;
+	pass mmap_mode=None to read everything into memory instead.
+	"""
+	if mmap_mode is None:
+		data = np.load(path)
+		return dict((name, data[name]) for name in data.files)
+	arrays = {}
+	archive = zipfile.ZipFile(path)
+	storeopen = open(path, 'rb')
+	for info in archive.infolist():
+		name = info.filename[:-4]												#strip '.npy'
+		if info.compress_type != zipfile.ZIP_STORED:
+			arrays[name] = np.load(archive.open(info))							#compressed member, cannot map
+			continue
+		storeopen.seek(_member_offset(storeopen, info))
+		version = np.lib.format.read_magic(storeopen)
+		if version == (1, 0):
+			shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(storeopen)
+		else:
+			shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(storeopen)
+		if not np.prod(shape):
+			arrays[name] = np.empty(shape, dtype=dtype)							#nothing to map
+			continue
+		arrays[name] = np.memmap(path, dtype=dtype, mode=mmap_mode, shape=shape,
+			order='F' if fortran_order else 'C', offset=storeopen.tell())
+	storeopen.close()
+	archive.close()
+	return arrays
@@ -0,0 +1,12 @@
+3 5.200000 5.100000 5.100000 12.100000
+6 18.200000 4.600000 4.600000 12.700000
+9 19.300000 9.900000 9.900000 17.600000
+12 17.400000 2.400000 2.400000 12.500000
+15 18.700000 11.800000 11.800000 3.300000
+18 11.500000 10.400000 10.400000 1.800000
+21 18.500000 10.800000 10.800000 19.600000
+24 19.900000 17.700000 17.700000 6.300000
+27 6.700000 6.900000 6.900000 14.400000
+30 11.500000 5.100000 5.100000 12.500000
+33 8.500000 10.500000 10.500000 6.400000
+36 14.600000 10.200000 10.200000 16.100000
@@ -0,0 +1,66 @@
+#===================
+# test_benchECMWF.py
+#===================
+"""
+***meta***
+The synthetic documents and the local stand-in server used by the benchmark and the tests.
+"""
+
+import os, sys, datetime, unittest
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+try:
+	import httplib																#python 2.7
+except ImportError:
+	import http.client as httplib
+import benchECMWF
+import parseECMWF
+
+RUN_DT = datetime.datetime(2016, 2, 10, 0)
+QUERY = 'lat=55.6986;lon=-120.4306;'
+
+
+class MakeForecastTest(unittest.TestCase):
+
+	def test_parses_to_all_records(self):
+		doc = benchECMWF.make_forecast(55.6986, -120.4306, 6, RUN_DT, seed=3)
+		self.assertEqual(doc, benchECMWF.make_forecast(55.6986, -120.4306, 6, RUN_DT, seed=3))
+		meta_time, rows, precip_rows = parseECMWF.parse_bytes(doc, benchECMWF.var_names, benchECMWF.var_attr, precip=True)
+		self.assertEqual(meta_time, '2016-02-10T00:00:00Z')
+		self.assertEqual([len(row) for row in rows], [1 + len(benchECMWF.var_names)] * 6)
+		self.assertEqual(len(precip_rows), 6)
+
+
+class ServeTest(unittest.TestCase):
+
+	def setUp(self):
+		self.doc = benchECMWF.make_forecast(55.6986, -120.4306, 2, RUN_DT)
+		self.server = None
+
+	def tearDown(self):
+		self.server.shutdown()
+		self.server.server_close()
+
+	def get(self, query, headers={}):
+		conn = httplib.HTTPConnection('127.0.0.1', self.server.server_address[1], timeout=10)
+		conn.request('GET', '/weatherapi/locationforecast/1.9/?' + query, headers=headers)
+		response = conn.getresponse()
+		result = response.status, response.getheader('ETag'), response.read()
+		conn.close()
+		return result
+
+	def test_failures_then_document(self):
+		self.server, api_url = benchECMWF.serve({QUERY: self.doc}, failures={QUERY: 2})
+		self.assertEqual([self.get(QUERY)[0] for i in range(3)], [503, 503, 200])
+		self.assertEqual(self.get('lat=0;lon=0;')[0], 404)
+		self.assertEqual(self.server.requests, [(QUERY, 503), (QUERY, 503), (QUERY, 200), ('lat=0;lon=0;', 404)])
+
+	def test_etags(self):
+		self.server, api_url = benchECMWF.serve({QUERY: self.doc}, etags=True)
+		status, etag, body = self.get(QUERY)
+		self.assertEqual((status, body), (200, self.doc))
+		self.assertEqual(self.get(QUERY, {'If-None-Match': etag}), (304, etag, b''))
+		self.assertEqual(self.get(QUERY, {'If-None-Match': '"other"'})[0], 200)
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,103 @@
+#===================
+# test_cacheECMWF.py
+#===================
+"""
+***meta***
+Response cache: entries, validators, conditional request headers and eviction.
+"""
+
+import os, sys, time, shutil, tempfile, datetime, unittest
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import numpy as np
+import cacheECMWF
+import parseECMWF
+
+RUN_DT = datetime.datetime(2016, 2, 10, 0)
+VAR_NAMES = ['windSpeed', 'temperature']
+
+
+class Response(object):
+	"""Stand-in for an HTTP response: just the headers."""
+
+	def __init__(self, **headers):
+		self.headers = headers
+
+	def getheader(self, name):
+		return self.headers.get(name)
+
+
+def valid(**headers):
+	return cacheECMWF.validators(Response(**headers))
+
+
+def forecast(stn='Dokie', precip=None):
+	times = np.array(['2016-02-10T03:00:00', '2016-02-10T06:00:00'], dtype='datetime64[s]')
+	return parseECMWF.Forecast(stn, RUN_DT, None, times, np.array([[4.4, -1.], [5.2, -2.5]]), precip)
+
+
+class CacheTest(unittest.TestCase):
+
+	def setUp(self):
+		self.cache_dir = tempfile.mkdtemp(prefix='test_cacheECMWF') + os.sep
+		self.cache = cacheECMWF.open_cache(self.cache_dir)
+		self.key = cacheECMWF.cache_key(55.8167, -122.2586)
+
+	def tearDown(self):
+		shutil.rmtree(self.cache_dir)
+
+	def test_store_and_load(self):
+		cacheECMWF.store(self.cache, self.key, forecast(), valid(ETag='"a"', **{'Last-Modified': 'Wed, 10 Feb 2016 06:00:00 GMT'}), VAR_NAMES)
+		entry = cacheECMWF.lookup(self.cache, self.key, VAR_NAMES)
+		self.assertEqual(entry['termin'], '2016-02-10T00:00:00Z')
+		self.assertEqual(cacheECMWF.request_headers(entry),
+			{'If-None-Match': '"a"', 'If-Modified-Since': 'Wed, 10 Feb 2016 06:00:00 GMT'})
+		fcst = cacheECMWF.load(self.cache, entry, 'Other')
+		self.assertEqual((fcst.stn, fcst.run_dt, fcst.csvname), ('Other', RUN_DT, None))
+		self.assertTrue(np.array_equal(fcst.times, forecast().times))
+		self.assertTrue(np.array_equal(fcst.values, forecast().values))
+
+	def test_lookup_misses(self):
+		self.assertEqual(cacheECMWF.lookup(self.cache, self.key, VAR_NAMES), None)
+		self.assertEqual(cacheECMWF.request_headers(None), {})
+		cacheECMWF.store(self.cache, self.key, forecast(), valid(ETag='"a"'), VAR_NAMES)
+		self.assertEqual(cacheECMWF.lookup(self.cache, self.key, ['windSpeed']), None)		#other variables
+		self.assertEqual(cacheECMWF.lookup(self.cache, self.key, VAR_NAMES, precip=True), None)	#no precipitation kept
+		os.remove(self.cache_dir + self.key + '.npz')
+		self.assertEqual(cacheECMWF.lookup(self.cache, self.key, VAR_NAMES), None)			#file gone
+
+	def test_precipitation_kept(self):
+		precip = parseECMWF.precip_intervals([['2016-02-10T00:00:00Z', '2016-02-10T03:00:00Z', '0.4']])
+		cacheECMWF.store(self.cache, self.key, forecast(precip=precip), valid(), VAR_NAMES)
+		self.assertEqual(cacheECMWF.lookup(self.cache, self.key, VAR_NAMES), None)
+		fcst = cacheECMWF.load(self.cache, cacheECMWF.lookup(self.cache, self.key, VAR_NAMES, precip=True), 'Dokie')
+		self.assertTrue(np.array_equal(fcst.precip, precip))
+
+	def test_touch_refreshes_validators(self):
+		cacheECMWF.store(self.cache, self.key, forecast(), valid(ETag='"a"', **{'Last-Modified': 'old'}), VAR_NAMES)
+		self.cache['index'][self.key]['checked'] = 0
+		cacheECMWF.touch(self.cache, self.key, valid(ETag='"b"'))
+		entry = self.cache['index'][self.key]
+		self.assertEqual((entry['etag'], entry['last_modified']), ('"b"', 'old'))
+		self.assertTrue(entry['checked'] > 0)
+
+	def test_evict(self):
+		keys = [cacheECMWF.cache_key(50. + n, -120.) for n in range(3)]
+		for n, key in enumerate(keys):
+			cacheECMWF.store(self.cache, key, forecast(), valid(), VAR_NAMES)
+			self.cache['index'][key]['checked'] = time.time() - 100 * (3 - n)			#keys[0] is the oldest
+		cacheECMWF.evict(self.cache, 250, 1e9)
+		self.assertEqual(sorted(self.cache['index']), keys[1:])
+		cacheECMWF.evict(self.cache, 250, self.cache['index'][keys[2]]['bytes'])
+		self.assertEqual(sorted(self.cache['index']), keys[2:])
+		self.assertEqual(sorted(os.listdir(self.cache_dir)), [keys[2] + '.npz'])
+
+	def test_save_and_reopen(self):
+		cacheECMWF.store(self.cache, self.key, forecast(), valid(ETag='"a"'), VAR_NAMES)
+		cacheECMWF.save(self.cache)
+		self.assertEqual(cacheECMWF.open_cache(self.cache_dir)['index'], self.cache['index'])
+		open(self.cache_dir + 'index.json', 'w').write('{')
+		self.assertEqual(cacheECMWF.open_cache(self.cache_dir)['index'], {})
+
+
+if __name__ == '__main__':
+	unittest.main()
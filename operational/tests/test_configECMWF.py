@@ -0,0 +1,100 @@
+#===================
+# test_configECMWF.py
+#===================
+"""
+***meta***
+Parsing of the ini run configuration and the files each output profile writes.
+"""
+
+import os, sys, shutil, tempfile, datetime, unittest
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import numpy as np
+import configECMWF
+import getECMWF
+import parseECMWF
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data') + os.sep
+
+CONFIG = '''[run]
+data_dir = /data/
+fetch_workers = 4
+fetch_backoff = 0.5
+precip_flag = 1
+
+[stations]
+Dokie = 55.8167 -122.2586
+Cape_Scott = 50.7655 -127.9954
+
+[variables]
+windSpeed = mps (mps)
+temperature = value (c)
+
+[output hub]
+layout = hub
+vars = windSpeed temperature
+files = WND_HUB TMP_HUB
+
+[output tree]
+layout = csv
+dir = /tree/
+
+[output turbines]
+layout = sites
+sites = %(sites)s
+vars = windSpeed
+files = WND_SITE
+neighbours = 2
+'''
+
+
+class ConfigTest(unittest.TestCase):
+
+	def setUp(self):
+		self.tmp = tempfile.mkdtemp(prefix='test_configECMWF') + os.sep
+
+	def tearDown(self):
+		shutil.rmtree(self.tmp)
+
+	def load(self, text):
+		path = self.tmp + 'getECMWF.ini'
+		open(path, 'w').write(text)
+		return configECMWF.load_config(path, getECMWF.default_settings())
+
+	def test_load(self):
+		settings, stations, outputs = self.load(CONFIG %{'sites': DATA_DIR + 'stations.cfg'})
+		self.assertEqual((settings['data_dir'], settings['fetch_workers'], settings['fetch_backoff']), ('/data/', 4, 0.5))
+		self.assertEqual(settings['var_names'], ['windSpeed', 'temperature'])
+		self.assertEqual(settings['var_units'], ['(mps)', '(c)'])
+		self.assertEqual(settings['var_hub'], ['', ''])
+		self.assertEqual(stations.names, ['Dokie', 'Cape_Scott'])
+		self.assertEqual([(output.name, output.layout, output.dir) for output in outputs],
+			[('hub', 'hub', ''), ('tree', 'csv', '/tree/'), ('turbines', 'sites', '')])
+		self.assertEqual(outputs[0].vars.tolist(), [0, 1])
+		self.assertEqual(outputs[2].options['params'], {'power': 2., 'neighbours': 2})
+		self.assertEqual(outputs[2].options['sites'].height.tolist(), [80., 95., 95., 80.])
+
+	def test_errors(self):
+		self.assertRaises(ValueError, self.load, '[run]\nno_such_setting = 1\n')
+		self.assertRaises(ValueError, self.load, '[output x]\nlayout = parquet\n')
+		self.assertRaises(ValueError, self.load, '[output x]\nlayout = hub\nvars = snow\nfiles = SNOW_HUB\n')
+		self.assertRaises(ValueError, self.load, '[output x]\nlayout = hub\nvars = windSpeed\nfiles = A B\n')
+		self.assertRaises(ValueError, configECMWF.load_config, self.tmp + 'missing.ini', getECMWF.default_settings())
+
+	def test_default_outputs(self):
+		settings = getECMWF.default_settings(data_dir='/data/', columnar_dir='/col/', history_dir='')
+		outputs = configECMWF.default_outputs(settings)
+		self.assertEqual([(output.layout, output.dir, output.files) for output in outputs],
+			[('hub', '/data/', ['WND_HUB']), ('columnar', '/col/', [])])
+
+	def test_output_paths(self):
+		run_dt = datetime.datetime(2016, 2, 10, 0)
+		fcst = parseECMWF.Forecast('Dokie', run_dt, './run/2016-02-10_0000_Dokie.csv', None, None, np.zeros(0))
+		hub = configECMWF.Output('hub', 'hub', '/data/', np.array([0]), ['WND_HUB'], {})
+		tree = configECMWF.Output('tree', 'csv', '/tree/', None, [], {})
+		self.assertEqual(configECMWF.output_paths(hub, '16021000', [fcst], ['Dokie']), ['/data/16021000/ASCII/m/g3/WND_HUB.1.t'])
+		self.assertEqual(configECMWF.output_paths(tree, '16021000', [fcst, None], ['Dokie', 'Cape_Scott']),
+			['/tree/Dokie/2016/2/2016-02-10_0000_Dokie.csv', '/tree/Dokie/2016/2/precip2016-02-10_0000_Dokie.csv'])
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,128 @@
+#===================
+# test_fetchECMWF.py
+#===================
+"""
+***meta***
+fetch_all against benchECMWF.serve: ordering, retries on 5xx, 4xx and 304 handling, and
+logging from the download threads.
+"""
+
+import os, sys, time, datetime, threading, unittest
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import benchECMWF
+import fetchECMWF
+
+LAT = [55.6986, 55.1887, 50.7655]
+LON = [-120.4306, -120.8682, -127.9954]
+
+
+def read_body(n, response):
+	return response.status, response.read()
+
+
+class SlowStdout(object):
+	"""stdout stand-in that hands the thread off between characters, so unlocked writes would interleave."""
+
+	def __init__(self):
+		self.chars = []
+
+	def write(self, text):
+		for char in text:
+			self.chars.append(char)
+			time.sleep(0)
+
+	def flush(self):
+		pass
+
+
+class FetchAllTest(unittest.TestCase):
+
+	def setUp(self):
+		run_dt = datetime.datetime(2016, 2, 10, 0)
+		self.queries = [fetchECMWF.station_url('', LAT[n], LON[n])[1:] for n in range(len(LAT))]
+		self.docs = dict((query, benchECMWF.make_forecast(LAT[n], LON[n], 4, run_dt, n)) for n, query in enumerate(self.queries))
+		self.servers = []
+
+	def tearDown(self):
+		for server in self.servers:
+			server.shutdown()
+			server.server_close()
+
+	def serve(self, **kwargs):
+		server, api_url = benchECMWF.serve(self.docs, **kwargs)
+		self.servers.append(server)
+		return server, [api_url + '?' + query for query in self.queries]
+
+	def test_results_in_url_order(self):
+		server, urls = self.serve()
+		stats = [None] * len(urls)
+		results = fetchECMWF.fetch_all(urls, read_body, workers=2, retries=0, backoff=0., stats=stats)
+		self.assertEqual(results, [(200, self.docs[query]) for query in self.queries])
+		self.assertEqual([entry['attempts'] for entry in stats], [1, 1, 1])
+		self.assertEqual([entry['bytes'] for entry in stats], [len(self.docs[query]) for query in self.queries])
+
+	def test_retries_5xx(self):
+		server, urls = self.serve(failures={self.queries[1]: 2})
+		stats = [None] * len(urls)
+		results = fetchECMWF.fetch_all(urls, read_body, workers=2, retries=3, backoff=0., stats=stats)
+		self.assertEqual(results[1], (200, self.docs[self.queries[1]]))
+		self.assertEqual(stats[1]['attempts'], 3)
+		self.assertEqual([status for query, status in server.requests if query == self.queries[1]], [503, 503, 200])
+
+	def test_gives_up_after_retries(self):
+		server, urls = self.serve(failures={self.queries[0]: 5})
+		stats = [None] * len(urls)
+		results = fetchECMWF.fetch_all(urls, read_body, workers=2, retries=2, backoff=0., stats=stats)
+		self.assertEqual(results[0], None)
+		self.assertEqual((stats[0]['attempts'], stats[0]['status']), (3, 503))
+		self.assertEqual(results[2], (200, self.docs[self.queries[2]]))				#the others are unaffected
+
+	def test_4xx_not_retried(self):
+		server, urls = self.serve()
+		urls[0] = urls[0].replace('lat=', 'lat=9')
+		results = fetchECMWF.fetch_all(urls, read_body, workers=1, retries=3, backoff=0.)
+		self.assertEqual(results[0], None)
+		self.assertEqual([status for query, status in server.requests].count(404), 1)
+
+	def test_304_passed_to_consumer(self):
+		server, urls = self.serve(etags=True)
+		def read_etag(n, response):
+			response.read()
+			return response.getheader('ETag')
+		etags = fetchECMWF.fetch_all(urls, read_etag, retries=0, backoff=0.)
+		headers = [{'If-None-Match': etags[0]}, {}, {'If-None-Match': '"stale"'}]
+		results = fetchECMWF.fetch_all(urls, read_body, retries=0, backoff=0., headers=headers)
+		self.assertEqual(results[0], (304, b''))
+		self.assertEqual(results[1], (200, self.docs[self.queries[1]]))
+		self.assertEqual(results[2], (200, self.docs[self.queries[2]]))
+
+
+class LogTest(unittest.TestCase):
+
+	def test_lines_from_threads_stay_whole(self):
+		def write(n):
+			for i in range(20):
+				fetchECMWF.log('station %d line %d' %(n, i))
+		stdout, sys.stdout = sys.stdout, SlowStdout()
+		try:
+			threads = [threading.Thread(target=write, args=(n,)) for n in range(4)]
+			for thread in threads:
+				thread.start()
+			for thread in threads:
+				thread.join()
+		finally:
+			stdout, sys.stdout = sys.stdout, stdout
+		lines = ''.join(stdout.chars).splitlines()
+		self.assertEqual(sorted(lines), sorted('station %d line %d' %(n, i) for n in range(4) for i in range(20)))
+
+
+class UniquePointsTest(unittest.TestCase):
+
+	def test_groups_rounded_coordinates(self):
+		first, point = fetchECMWF.unique_points([55.1887, 50.7655, 55.18871, 55.1887], [-120.8682, -127.9954, -120.86819, -120.8682])
+		self.assertEqual(first, [0, 1])
+		self.assertEqual(point, [0, 1, 0, 0])
+
+
+if __name__ == '__main__':
+	unittest.main()
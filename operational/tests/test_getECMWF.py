@@ -0,0 +1,240 @@
+#===================
+# test_getECMWF.py
+#===================
+"""
+***meta***
+End-to-end runs of getECMWF against canned documents served by benchECMWF.serve.
+
+tests/data holds one locationforecast document per point of stations.cfg (Quality_Wind2
+shares Quality_Wind's point) and, in golden/, the station csv files and WND_HUB.1.t the
+original getECMWF.py wrote for them. golden/local/ holds the station and precipitation csv
+tree the original local/getECMWF.py (all 11 variables, precip_flag = 1) wrote for the same
+documents. Every fetch and convert mode must reproduce those byte for byte.
+"""
+
+import os, sys, shutil, tempfile, unittest
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import benchECMWF
+import configECMWF
+import fetchECMWF
+import getECMWF
+import statsECMWF
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data') + os.sep
+GOLDEN_DIR = DATA_DIR + 'golden' + os.sep
+LOCAL_INI = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'local', 'getECMWF.ini')
+RUN_KEY = '16021000'
+
+
+def documents():
+	"""Served documents keyed by query string, one per point of stations.cfg."""
+	stations, lat, lon = configECMWF.read_stations(DATA_DIR + 'stations.cfg')
+	docs = {}
+	for nStn, stn in enumerate(stations):
+		query = fetchECMWF.station_url('', lat[nStn], lon[nStn])[1:]
+		if query not in docs:
+			docs[query] = open(DATA_DIR + stn + '.xml', 'rb').read()
+	return docs
+
+
+def read(path):
+	return open(path, 'rb').read()
+
+
+class RunTest(unittest.TestCase):
+	"""Each test gets its own server, run directory and data directory."""
+
+	etags = False
+
+	def setUp(self):
+		self.docs = documents()
+		self.server, self.api_url = benchECMWF.serve(self.docs, etags=self.etags)
+		self.tmp = tempfile.mkdtemp(prefix='test_getECMWF') + os.sep
+		self.data_dir = self.tmp + 'out' + os.sep
+		self.hub_dir = self.data_dir + RUN_KEY + '/ASCII/m/g3/'
+		os.makedirs(self.hub_dir)
+		self.stations, self.lat, self.lon = configECMWF.read_stations(DATA_DIR + 'stations.cfg')
+
+	def tearDown(self):
+		self.server.shutdown()
+		self.server.server_close()
+		shutil.rmtree(self.tmp)
+
+	def settings(self, **overrides):
+		settings = getECMWF.default_settings(cfg_file=DATA_DIR + 'stations.cfg', data_dir=self.data_dir,
+			api_url=self.api_url, cache_dir='', fetch_workers=2, fetch_backoff=0.)
+		settings.update(overrides)
+		return settings
+
+	def run_once(self, settings, outputs=None):
+		"""fetch and publish as main() does, in a fresh run directory; returns (results, published, report)."""
+		if os.path.isdir(settings['run_dir']):
+			shutil.rmtree(settings['run_dir'])
+		os.makedirs(settings['run_dir'])
+		report = statsECMWF.new_report()
+		results = getECMWF.fetch(settings, self.stations, self.lat, self.lon, report)
+		published = getECMWF.publish(settings, self.stations, self.lat, self.lon, results, report, outputs)
+		return results, published, report
+
+	def assertGolden(self, run_dir):
+		for name in sorted(os.listdir(GOLDEN_DIR)):
+			if name.endswith('.csv'):
+				self.assertEqual(read(run_dir + name), read(GOLDEN_DIR + name), name)
+		self.assertEqual(read(self.hub_dir + 'WND_HUB.1.t'), read(GOLDEN_DIR + 'WND_HUB.1.t'))
+		self.assertTrue(os.path.exists(self.hub_dir + 'WND_HUB.1.t.OK'))
+
+
+class BaselineTest(RunTest):
+
+	def check_mode(self, **overrides):
+		settings = self.settings(run_dir=self.tmp + 'run' + os.sep, **overrides)
+		results, published, report = self.run_once(settings)
+		self.assertGolden(settings['run_dir'])
+		self.assertEqual(published, [self.hub_dir + 'WND_HUB.1.t'])
+
+	def test_stream(self):
+		self.check_mode()
+
+	def test_saved_xml(self):
+		self.check_mode(stream_convert=False)
+
+	def test_process_pool(self):
+		self.check_mode(convert_workers=2)
+
+	def test_shared_point_fetched_once(self):
+		self.check_mode()
+		self.assertEqual(len(self.server.requests), len(self.docs))				#Quality_Wind2 rides along
+
+
+class LocalProfileTest(RunTest):
+	"""The local/getECMWF.ini profile: 11 variables, precipitation and the csv tree."""
+
+	def check_mode(self, **overrides):
+		settings, stations, outputs = configECMWF.load_config(LOCAL_INI, getECMWF.default_settings())	#stations come from stations.cfg
+		settings.update(data_dir=self.data_dir, run_dir=self.tmp + 'run' + os.sep, api_url=self.api_url, cache_dir='',
+			fetch_workers=2, fetch_backoff=0., **overrides)
+		outputs = [output._replace(dir=output.dir or settings['data_dir']) for output in outputs]		#as main() does
+		self.assertEqual((len(settings['var_names']), settings['precip_flag'], [output.layout for output in outputs]), (11, 1, ['csv']))
+		self.run_once(settings, outputs)
+		golden_dir = GOLDEN_DIR + 'local' + os.sep
+		for stn in self.stations:
+			month_dir = stn + '/2016/2/'
+			names = sorted(os.listdir(golden_dir + month_dir))
+			self.assertEqual(sorted(os.listdir(self.data_dir + month_dir)), names)
+			for name in names:
+				self.assertEqual(read(self.data_dir + month_dir + name), read(golden_dir + month_dir + name), name)
+
+	def test_stream(self):
+		self.check_mode()
+
+	def test_saved_xml(self):
+		self.check_mode(stream_convert=False)
+
+	def test_process_pool(self):
+		self.check_mode(convert_workers=2)
+
+
+class FailureTest(RunTest):
+
+	def check_bad_document(self, **overrides):
+		query = fetchECMWF.station_url('', self.lat[0], self.lon[0])[1:]
+		self.docs[query] = self.docs[query][:len(self.docs[query]) // 2]			#truncated mid-document
+		settings = self.settings(run_dir=self.tmp + 'run' + os.sep, **overrides)
+		os.makedirs(settings['run_dir'])
+		report = statsECMWF.new_report()
+		results = getECMWF.fetch(settings, self.stations, self.lat, self.lon, report)
+		self.assertEqual([fcst is None for fcst in results], [True, False, False, False])
+		self.assertTrue(report['stations'][self.stations[0]]['failed'])
+		self.assertFalse(report['stations'][self.stations[1]]['failed'])
+
+	def test_saved_xml(self):
+		self.check_bad_document(stream_convert=False)
+
+	def test_process_pool(self):
+		self.check_bad_document(convert_workers=2)
+
+
+class IncrementalTest(RunTest):
+
+	def test_published_run_is_noop(self):
+		settings = self.settings(run_dir=self.tmp + 'run' + os.sep)
+		self.run_once(settings)
+		hub = self.hub_dir + 'WND_HUB.1.t'
+		os.utime(hub, (0, 0))
+		results, published, report = self.run_once(settings)
+		self.assertEqual(published, [])
+		self.assertEqual(os.path.getmtime(hub), 0)
+
+	def test_missing_hub_file_republishes(self):
+		settings = self.settings(run_dir=self.tmp + 'run' + os.sep)
+		self.run_once(settings)
+		os.remove(self.hub_dir + 'WND_HUB.1.t')
+		results, published, report = self.run_once(settings)
+		self.assertEqual(published, [self.hub_dir + 'WND_HUB.1.t'])
+		self.assertGolden(settings['run_dir'])
+
+	def test_not_incremental_always_publishes(self):
+		settings = self.settings(run_dir=self.tmp + 'run' + os.sep, incremental=False)
+		self.run_once(settings)
+		results, published, report = self.run_once(settings)
+		self.assertEqual(published, [self.hub_dir + 'WND_HUB.1.t'])
+
+
+class CacheTest(RunTest):
+
+	etags = True
+
+	def cached_stations(self, report):
+		return sorted(stn for stn, fields in report['stations'].items() if fields.get('cached'))
+
+	def test_miss_then_hit(self):
+		settings = self.settings(run_dir=self.tmp + 'run' + os.sep, cache_dir=self.tmp + 'cache' + os.sep, incremental=False)
+		results, published, report = self.run_once(settings)
+		self.assertEqual(self.cached_stations(report), [])
+		self.assertEqual(set(status for query, status in self.server.requests), set([200]))
+		self.assertGolden(settings['run_dir'])
+
+		del self.server.requests[:]
+		results, published, report = self.run_once(settings)
+		self.assertEqual(set(status for query, status in self.server.requests), set([304]))
+		self.assertEqual(self.cached_stations(report), ['Bear_Mnt', 'Cape_Scott', 'Quality_Wind'])
+		self.assertGolden(settings['run_dir'])										#csv files restored from the cache
+
+	def test_new_model_run_misses(self):
+		settings = self.settings(run_dir=self.tmp + 'run' + os.sep, cache_dir=self.tmp + 'cache' + os.sep, incremental=False)
+		self.run_once(settings)
+		for query in self.docs:
+			self.docs[query] = self.docs[query].replace(b'termin="2016-02-10T00:00:00Z"', b'termin="2016-02-10T12:00:00Z"')
+		os.makedirs(self.data_dir + '16021012/ASCII/m/g3/')
+		del self.server.requests[:]
+		results, published, report = self.run_once(settings)
+		self.assertEqual(set(status for query, status in self.server.requests), set([200]))
+		self.assertEqual(self.cached_stations(report), [])
+		self.assertEqual(set(fcst.run_dt.hour for fcst in results), set([12]))
+		self.assertEqual(published, [self.data_dir + '16021012/ASCII/m/g3/WND_HUB.1.t'])
+
+	def test_changed_document_same_run_uses_cache(self):
+		settings = self.settings(run_dir=self.tmp + 'run' + os.sep, cache_dir=self.tmp + 'cache' + os.sep, incremental=False)
+		self.run_once(settings)
+		query = fetchECMWF.station_url('', self.lat[0], self.lon[0])[1:]
+		self.docs[query] = self.docs[query].replace(b'created="', b'created="x')		#new ETag, same model run
+		del self.server.requests[:]
+		results, published, report = self.run_once(settings)
+		self.assertEqual(sorted(status for query, status in self.server.requests), [200, 304, 304])
+		self.assertEqual(self.cached_stations(report), ['Bear_Mnt', 'Cape_Scott', 'Quality_Wind'])
+		self.assertGolden(settings['run_dir'])
+
+	def test_csv_output_includes_cached_stations(self):
+		settings = self.settings(run_dir=self.tmp + 'run' + os.sep, cache_dir=self.tmp + 'cache' + os.sep, incremental=False)
+		tree = configECMWF.Output('tree', 'csv', self.tmp + 'tree' + os.sep, None, [], {})
+		self.run_once(settings, [tree])
+		shutil.rmtree(tree.dir)
+		results, published, report = self.run_once(settings, [tree])
+		self.assertEqual(len(published), len(self.stations))
+		for stn in self.stations:
+			name = '2016-02-10_0000_' + stn + '.csv'
+			self.assertEqual(read(tree.dir + stn + '/2016/2/' + name), read(GOLDEN_DIR + name))
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,72 @@
+#===================
+# test_historyECMWF.py
+#===================
+"""
+***meta***
+History archive: ingest, duplicate runs, interrupted ingests and queries.
+"""
+
+import os, sys, shutil, tempfile, datetime, unittest
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import numpy as np
+import historyECMWF
+import parseECMWF
+
+RUN_DT = datetime.datetime(2016, 2, 10, 0)
+VAR_NAMES = ['windSpeed', 'temperature']
+
+
+def forecast(stn, run_dt, leads=(3, 6, 9), offset=0.):
+	times = np.array([run_dt + datetime.timedelta(hours=lead) for lead in leads], dtype='datetime64[s]')
+	values = offset + np.arange(2 * len(leads), dtype=float).reshape(len(leads), 2)
+	return parseECMWF.Forecast(stn, run_dt, None, times, values, None)
+
+
+class HistoryTest(unittest.TestCase):
+
+	def setUp(self):
+		self.history_dir = tempfile.mkdtemp(prefix='test_historyECMWF') + os.sep
+
+	def tearDown(self):
+		shutil.rmtree(self.history_dir)
+
+	def test_ingest_skips_archived_runs(self):
+		self.assertEqual(historyECMWF.ingest(self.history_dir, [forecast('Dokie', RUN_DT), None], VAR_NAMES), 3)
+		later = RUN_DT + datetime.timedelta(hours=12)
+		added = historyECMWF.ingest(self.history_dir, [forecast('Dokie', RUN_DT), forecast('Dokie', later)], VAR_NAMES)
+		self.assertEqual(added, 3)
+		self.assertEqual(len(historyECMWF.query(self.history_dir)['lead']), 6)
+
+	def test_query_by_station_run_and_lead(self):
+		later = RUN_DT + datetime.timedelta(hours=12)
+		historyECMWF.ingest(self.history_dir, [forecast('Dokie', RUN_DT), forecast('Cape_Scott', RUN_DT, offset=100.)], VAR_NAMES)
+		historyECMWF.ingest(self.history_dir, [forecast('Dokie', later, offset=10.), forecast('Cape_Scott', later, offset=110.)], VAR_NAMES)
+
+		result = historyECMWF.query(self.history_dir, station='Cape_Scott', lead=6)
+		self.assertEqual(list(result['station']), ['Cape_Scott', 'Cape_Scott'])
+		self.assertEqual(result['values'].tolist(), [[102., 103.], [112., 113.]])
+		self.assertEqual(result['var_names'], VAR_NAMES)
+
+		result = historyECMWF.query(self.history_dir, lead=[3, 9], start=later)
+		self.assertEqual(list(result['station']), ['Dokie', 'Dokie', 'Cape_Scott', 'Cape_Scott'])
+		self.assertEqual(result['lead'].tolist(), [3, 9, 3, 9])
+
+		result = historyECMWF.query(self.history_dir, end=RUN_DT)
+		self.assertEqual(len(result['run']), 6)
+		self.assertEqual(len(historyECMWF.query(self.history_dir, station='Bear_Mnt')['run']), 0)
+
+	def test_other_variables_rejected(self):
+		historyECMWF.ingest(self.history_dir, [forecast('Dokie', RUN_DT)], VAR_NAMES)
+		self.assertRaises(ValueError, historyECMWF.ingest, self.history_dir, [forecast('Dokie', RUN_DT)], ['windSpeed'])
+
+	def test_interrupted_ingest_is_dropped(self):
+		historyECMWF.ingest(self.history_dir, [forecast('Dokie', RUN_DT)], VAR_NAMES)
+		open(self.history_dir + 'values.bin', 'ab').write(b'\0' * 24)					#values written, index and runs.bin not
+		later = RUN_DT + datetime.timedelta(hours=12)
+		historyECMWF.ingest(self.history_dir, [forecast('Dokie', later, offset=10.)], VAR_NAMES)
+		result = historyECMWF.query(self.history_dir, start=later)
+		self.assertEqual(result['values'][:, 0].tolist(), [10., 12., 14.])
+
+
+if __name__ == '__main__':
+	unittest.main()
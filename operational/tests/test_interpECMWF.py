@@ -0,0 +1,76 @@
+#===================
+# test_interpECMWF.py
+#===================
+"""
+***meta***
+Site weights, interpolation of the station cube and the hub height wind profile.
+"""
+
+import os, sys, shutil, tempfile, unittest
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import numpy as np
+import interpECMWF
+
+
+def sites(lat, lon, height=80.):
+	return interpECMWF.Sites(['S%d' %n for n in range(len(lat))], np.array(lat, dtype=float),
+		np.array(lon, dtype=float), np.full(len(lat), height))
+
+
+class WeightsTest(unittest.TestCase):
+
+	def test_idw_site_on_station(self):
+		index, weight = interpECMWF.idw_weights([50., 51., 52.], [-120.] * 3, [51.], [-120.])
+		self.assertEqual(index[0, 0], 1)
+		self.assertAlmostEqual(weight[0, 0], 1., 6)
+		self.assertAlmostEqual(weight.sum(), 1.)
+
+	def test_idw_midpoint(self):
+		index, weight = interpECMWF.idw_weights([50., 52.], [-120.] * 2, [51.], [-120.])
+		self.assertTrue(np.allclose(weight, 0.5, atol=1e-3))
+
+	def test_bilinear_grid(self):
+		lat, lon = np.meshgrid([50., 51.], [-121., -120.], indexing='ij')
+		index, weight = interpECMWF.bilinear_weights(lat.ravel(), lon.ravel(), [50.25], [-120.5])
+		cube = np.array([1., 2., 3., 4.])										#value = 1 + 2 * (lat - 50) + (lon + 121)
+		self.assertAlmostEqual((cube[index] * weight).sum(), 2.)
+
+	def test_bilinear_needs_full_grid(self):
+		self.assertRaises(ValueError, interpECMWF.bilinear_weights, [50., 50., 51.], [-121., -120., -121.], [50.5], [-120.5])
+
+	def test_weights_cached(self):
+		cache_dir = tempfile.mkdtemp(prefix='test_interpECMWF') + os.sep
+		try:
+			first = interpECMWF.site_weights([50., 52.], [-120.] * 2, sites([51.], [-120.]), 'idw', cache_dir, power=2.)
+			self.assertEqual(len([name for name in os.listdir(cache_dir) if name.startswith('weights_')]), 1)
+			again = interpECMWF.site_weights([50., 52.], [-120.] * 2, sites([51.], [-120.]), 'idw', cache_dir, power=2.)
+			self.assertTrue(np.array_equal(first[1], again[1]))
+			interpECMWF.site_weights([50., 52.], [-120.] * 2, sites([51.], [-120.]), 'idw', cache_dir, power=1.)
+			self.assertEqual(len([name for name in os.listdir(cache_dir) if name.startswith('weights_')]), 2)
+		finally:
+			shutil.rmtree(cache_dir)
+
+
+class InterpolateTest(unittest.TestCase):
+
+	def test_missing_station_renormalized(self):
+		index = np.array([[0, 1]])
+		weight = np.array([[0.25, 0.75]])
+		cube = np.array([[[1.], [1.]], [[3.], [np.nan]]])						#station x lead x var
+		self.assertEqual(interpECMWF.interpolate(index, weight, cube).ravel().tolist(), [2.5, 1.])
+
+	def test_circular_mean(self):
+		index = np.array([[0, 1]])
+		weight = np.array([[0.5, 0.5]])
+		cube = np.array([[[350.]], [[20.]]])
+		self.assertAlmostEqual(interpECMWF.interpolate(index, weight, cube, [0])[0, 0, 0], 5.)
+
+	def test_wind_profile(self):
+		speed = np.array([[10.], [10.]])
+		self.assertTrue(np.allclose(interpECMWF.wind_profile(speed, [10., 80.], 'power', alpha=0.5), [[10.], [10. * 8 ** 0.5]]))
+		self.assertTrue(np.allclose(interpECMWF.wind_profile(speed, [10., 10.], 'log'), speed))
+		self.assertRaises(ValueError, interpECMWF.wind_profile, speed, [80., 80.], 'cubic')
+
+
+if __name__ == '__main__':
+	unittest.main()
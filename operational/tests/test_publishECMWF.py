@@ -0,0 +1,100 @@
+#===================
+# test_publishECMWF.py
+#===================
+"""
+***meta***
+Atomic replacement of published files and the published-run manifest.
+"""
+
+import os, sys, shutil, tempfile, datetime, threading, unittest
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import publishECMWF
+
+RUN_DT = datetime.datetime(2016, 2, 10, 0)
+TERMIN = '2016-02-10T00:00:00Z'
+
+
+class AtomicWriteTest(unittest.TestCase):
+
+	def setUp(self):
+		self.tmp = tempfile.mkdtemp(prefix='test_publishECMWF') + os.sep
+
+	def tearDown(self):
+		shutil.rmtree(self.tmp)
+
+	def test_replaces_target(self):
+		path = self.tmp + 'WND_HUB.1.t'
+		open(path, 'w').write('old')
+		with publishECMWF.atomic_write(path) as hubopen:
+			hubopen.write('new')
+			self.assertEqual(open(path).read(), 'old')								#not visible until the block completes
+		self.assertEqual(open(path).read(), 'new')
+		self.assertEqual(os.listdir(self.tmp), ['WND_HUB.1.t'])
+
+	def test_failure_keeps_old_file(self):
+		path = self.tmp + 'WND_HUB.1.t'
+		open(path, 'w').write('old')
+		try:
+			with publishECMWF.atomic_write(path) as hubopen:
+				hubopen.write('partial')
+				raise RuntimeError('interrupted')
+		except RuntimeError:
+			pass
+		self.assertEqual(open(path).read(), 'old')
+		self.assertEqual(os.listdir(self.tmp), ['WND_HUB.1.t'])
+
+	def test_threads_writing_one_target(self):
+		path = self.tmp + 'index.json'
+		errors = []
+		def write(n):
+			try:
+				for i in range(20):
+					with publishECMWF.atomic_write(path) as indexopen:
+						indexopen.write(str(n) * 1000)
+			except Exception as e:
+				errors.append(e)
+		threads = [threading.Thread(target=write, args=(n,)) for n in range(4)]
+		for thread in threads:
+			thread.start()
+		for thread in threads:
+			thread.join()
+		self.assertEqual(errors, [])
+		content = open(path).read()
+		self.assertEqual(content, content[0] * 1000)								#one writer's file, whole
+		self.assertEqual(os.listdir(self.tmp), ['index.json'])
+
+
+class ManifestTest(unittest.TestCase):
+
+	def setUp(self):
+		self.tmp = tempfile.mkdtemp(prefix='test_publishECMWF') + os.sep
+		self.manifest_file = self.tmp + 'published.json'
+
+	def tearDown(self):
+		shutil.rmtree(self.tmp)
+
+	def test_published_for_recorded_stations(self):
+		termins = {'Dokie': TERMIN, 'Cape_Scott': TERMIN}
+		with publishECMWF.lock(publishECMWF.manifest_lock(self.manifest_file)):
+			publishECMWF.update_manifest(self.manifest_file, '16021000', RUN_DT, termins, ['WND_HUB.1.t'])
+		manifest = publishECMWF.load_manifest(self.manifest_file)
+		self.assertTrue(publishECMWF.is_published(manifest, '16021000', termins))
+		self.assertTrue(publishECMWF.is_published(manifest, '16021000', {'Dokie': TERMIN}))
+		self.assertFalse(publishECMWF.is_published(manifest, '16021000', dict(termins, Bear_Mnt=TERMIN)))
+		self.assertFalse(publishECMWF.is_published(manifest, '16021012', termins))
+
+	def test_station_on_older_run_stays_unpublished(self):
+		termins = {'Dokie': TERMIN, 'Cape_Scott': '2016-02-09T12:00:00Z'}
+		manifest = {}
+		publishECMWF.record_published(manifest, '16021000', RUN_DT, termins, [])
+		self.assertEqual(manifest['16021000']['stations'], {'Dokie': TERMIN})
+		self.assertFalse(publishECMWF.is_published(manifest, '16021000', termins))
+		self.assertFalse(publishECMWF.is_published(manifest, '16021000', dict(termins, Cape_Scott=TERMIN)))	#caught up, not yet out
+
+	def test_unreadable_manifest_is_empty(self):
+		open(self.manifest_file, 'w').write('{')
+		self.assertEqual(publishECMWF.load_manifest(self.manifest_file), {})
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,93 @@
+#===================
+# test_storeECMWF.py
+#===================
+"""
+***meta***
+Columnar run files: write_run followed by load_run, memory-mapped and in memory.
+"""
+
+import os, sys, shutil, tempfile, datetime, unittest
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import numpy as np
+import parseECMWF
+import storeECMWF
+
+RUN_DT = datetime.datetime(2016, 2, 10, 0)
+STATIONS = ['Dokie', 'Bear_Mnt', 'Cape_Scott']
+LAT = [55.8167, 55.6986, 50.7655]
+LON = [-122.2586, -120.4306, -127.9954]
+VAR_NAMES = ['windSpeed', 'temperature']
+
+
+def forecasts():
+	"""Dokie with two leads, Bear_Mnt without data, Cape_Scott on an older run with a later lead."""
+	times = np.array(['2016-02-10T03:00:00', '2016-02-10T06:00:00'], dtype='datetime64[s]')
+	dokie = parseECMWF.Forecast('Dokie', RUN_DT, None, times, np.array([[4.4, -1.], [5.2, np.nan]]), None)
+	times = np.array(['2016-02-10T06:00:00', '2016-02-10T09:00:00'], dtype='datetime64[s]')
+	cape_scott = parseECMWF.Forecast('Cape_Scott', RUN_DT - datetime.timedelta(hours=12), None, times,
+		np.array([[9.1, 3.2], [10.5, 3.]]), None)
+	return [dokie, None, cape_scott]
+
+
+class RoundTripTest(unittest.TestCase):
+
+	def setUp(self):
+		self.tmp = tempfile.mkdtemp(prefix='test_storeECMWF') + os.sep
+		self.path = self.tmp + '16021000.npz'
+		storeECMWF.write_run(self.path, forecasts(), STATIONS, LAT, LON, VAR_NAMES)
+
+	def tearDown(self):
+		shutil.rmtree(self.tmp)
+
+	def check(self, arrays):
+		self.assertEqual(sorted(arrays), ['lat', 'lon', 'run', 'stations', 'times', 'values', 'var_names'])
+		self.assertEqual(arrays['stations'].tolist(), STATIONS)
+		self.assertEqual(arrays['var_names'].tolist(), VAR_NAMES)
+		self.assertEqual((arrays['lat'].dtype, arrays['lon'].dtype), (np.float32, np.float32))
+		self.assertTrue(np.array_equal(arrays['lat'], np.array(LAT, dtype=np.float32)))
+		self.assertTrue(np.array_equal(arrays['lon'], np.array(LON, dtype=np.float32)))
+
+		self.assertEqual(arrays['run'].dtype, np.dtype('datetime64[s]'))
+		self.assertEqual(arrays['run'][0], np.datetime64('2016-02-10T00:00:00'))
+		self.assertTrue(np.isnat(arrays['run'][1]))								#no data
+		self.assertEqual(arrays['run'][2], np.datetime64('2016-02-09T12:00:00'))
+		self.assertEqual(arrays['times'].dtype, np.dtype('datetime64[s]'))
+		self.assertEqual(arrays['times'].tolist(), [datetime.datetime(2016, 2, 10, h) for h in (3, 6, 9)])
+
+		values = arrays['values']
+		self.assertEqual((values.dtype, values.shape), (np.float32, (3, 3, 2)))
+		expected = np.array([[[4.4, -1.], [5.2, np.nan], [np.nan, np.nan]],
+			[[np.nan, np.nan]] * 3,
+			[[np.nan, np.nan], [9.1, 3.2], [10.5, 3.]]], dtype=np.float32)
+		self.assertTrue(np.array_equal(np.isnan(values), np.isnan(expected)))
+		self.assertTrue(np.array_equal(values[~np.isnan(values)], expected[~np.isnan(expected)]))
+
+	def test_memmapped(self):
+		arrays = storeECMWF.load_run(self.path)
+		self.check(arrays)
+		for name in ('lat', 'lon', 'run', 'times', 'values', 'stations', 'var_names'):
+			self.assertTrue(isinstance(arrays[name], np.memmap), name)
+		self.assertFalse(arrays['values'].flags.writeable)
+
+	def test_copy_on_write(self):
+		arrays = storeECMWF.load_run(self.path, mmap_mode='c')
+		arrays['values'][0, 0, 0] = 0.
+		self.check(storeECMWF.load_run(self.path))								#file left untouched
+
+	def test_in_memory(self):
+		arrays = storeECMWF.load_run(self.path, mmap_mode=None)
+		self.check(arrays)
+		self.assertFalse(any(isinstance(array, np.memmap) for array in arrays.values()))
+
+	def test_empty_member(self):
+		fcst = forecasts()[0]
+		fcst = fcst._replace(values=np.empty((len(fcst.times), 0)))
+		storeECMWF.write_run(self.path, [fcst], STATIONS[:1], LAT[:1], LON[:1], [])
+		arrays = storeECMWF.load_run(self.path)
+		self.assertEqual((arrays['values'].dtype, arrays['values'].shape), (np.float32, (1, 2, 0)))
+		self.assertEqual(arrays['var_names'].shape, (0,))
+		self.assertEqual(arrays['times'].shape, (2,))
+
+
+if __name__ == '__main__':
+	unittest.main()